@@ -0,0 +1,188 @@
+""" Signing rates of the campaigns, per minute, hour and day
+
+Every signature added or removed is counted in the SignatureRate row of its
+campaign and time bucket, for each resolution, in the same transaction as the
+signature counters. Growth curves are read from these rows only: their cost
+depends on the number of buckets shown, not on the number of signatures.
+Rates per minute and per hour are removed after analytics_minute_days and
+analytics_hour_days.
+"""
+import datetime
+import functools
+import collections
+
+from sqlalchemy.exc import IntegrityError
+
+import config
+from db_models import db, Signatory, SignatureCount, SignatureRate
+from storage import upsert_insert
+
+RESOLUTIONS = {
+    "minute": datetime.timedelta(minutes=1),
+    "hour": datetime.timedelta(hours=1),
+    "day": datetime.timedelta(days=1),
+}
+
+# Buckets shown by default, and at most, per resolution
+DEFAULT_POINTS = {"minute": 120, "hour": 168, "day": 365}
+MAX_POINTS = 1000
+
+
+def retention(resolution):
+    """ Age after which the rates of a resolution are removed, or None to keep them """
+    if resolution == "minute":
+        return datetime.timedelta(days=config.analytics_minute_days)
+    if resolution == "hour":
+        return datetime.timedelta(days=config.analytics_hour_days)
+    return None
+
+
+def bucket_start(moment, resolution):
+    """ Start of the bucket of a resolution that contains moment """
+    step = RESOLUTIONS[resolution]
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + (moment - midnight) // step * step
+
+
+def record_rate(slug, change, now):
+    """
+    Count change signatures (negative when removed) in the buckets of now.
+
+    Like adjust_counts, this must be called in the transaction of the change.
+    """
+    added, removed = (change, 0) if change > 0 else (0, -change)
+    now = now.replace(tzinfo=None)
+    buckets = {resolution: bucket_start(now, resolution) for resolution in RESOLUTIONS}
+
+    insert = upsert_insert(db.session)
+    if insert is not None:
+        db.session.execute(upsert_rates(insert), {"slug": slug, "added": added, "removed": removed, **buckets})
+    else:
+        for resolution, bucket in buckets.items():
+            rate = SignatureRate.query.filter_by(campaign=slug, resolution=resolution, bucket=bucket)
+            increment = {"added": SignatureRate.added + added, "removed": SignatureRate.removed + removed}
+            if rate.update(increment, synchronize_session=False):
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.add(SignatureRate(campaign=slug, resolution=resolution, bucket=bucket,
+                                                 added=added, removed=removed))
+            except IntegrityError:
+                rate.update(increment, synchronize_session=False)
+
+    # Remove the expired rates of the campaign, at most once per minute
+    if pruned.get(slug) != buckets["minute"]:
+        pruned[slug] = buckets["minute"]
+        for resolution, bucket in buckets.items():
+            if (keep := retention(resolution)) is not None:
+                SignatureRate.query.filter(
+                    SignatureRate.campaign == slug,
+                    SignatureRate.resolution == resolution,
+                    SignatureRate.bucket < bucket - keep,
+                ).delete(synchronize_session=False)
+
+
+# Minute bucket of the last removal of expired rates, by campaign
+pruned = {}
+
+
+@functools.cache
+def upsert_rates(insert):
+    """ Statement adding a change to the three buckets of a campaign, in one INSERT ... ON CONFLICT """
+    table = SignatureRate.__table__
+    statement = insert(table).values([
+        {"campaign": db.bindparam("slug"), "resolution": resolution, "bucket": db.bindparam(resolution),
+         "added": db.bindparam("added"), "removed": db.bindparam("removed")}
+        for resolution in RESOLUTIONS
+    ])
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.campaign, table.c.resolution, table.c.bucket],
+        set_={"added": table.c.added + statement.excluded.added,
+              "removed": table.c.removed + statement.excluded.removed},
+    )
+
+
+def delete_rates(slug):
+    """ Remove the rates of a deleted campaign """
+    SignatureRate.query.filter_by(campaign=slug).delete()
+
+
+def rebuild_rates():
+    """
+    Recompute the rates of all campaigns from the signature creation dates.
+
+    Signatures removed in the past and signatures made before creation dates
+    were recorded can not be counted. Returns the number of buckets written.
+    """
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    oldest = {resolution: now - keep for resolution in RESOLUTIONS if (keep := retention(resolution)) is not None}
+    buckets = collections.Counter()
+
+    rows = (
+        db.session.query(Signatory.campaign, Signatory.creation_date)
+        .filter(Signatory.creation_date.is_not(None))
+        .yield_per(10000)
+    )
+    for slug, created in rows:
+        created = created.replace(tzinfo=None)
+        for resolution in RESOLUTIONS:
+            if resolution not in oldest or created >= oldest[resolution]:
+                buckets[slug, resolution, bucket_start(created, resolution)] += 1
+
+    SignatureRate.query.delete()
+    db.session.add_all(
+        SignatureRate(campaign=slug, resolution=resolution, bucket=bucket, added=added, removed=0)
+        for (slug, resolution, bucket), added in buckets.items()
+    )
+    db.session.commit()
+    return len(buckets)
+
+
+def growth(slug, resolution="hour", points=None):
+    """
+    Return the last points buckets of a campaign up to now, oldest first.
+
+    Each bucket has its start (in UTC), the signatures added and removed in
+    it, and the total number of signatures at its end. Totals are counted
+    back from the current signature counter.
+    """
+    step = RESOLUTIONS[resolution]
+    points = min(points or DEFAULT_POINTS[resolution], MAX_POINTS)
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    last = bucket_start(now, resolution)
+    first = last - (points - 1) * step
+
+    rows = (
+        db.session.query(SignatureRate.bucket, SignatureRate.added, SignatureRate.removed)
+        .filter(
+            SignatureRate.campaign == slug,
+            SignatureRate.resolution == resolution,
+            SignatureRate.bucket >= first,
+        )
+        .all()
+    )
+    changes = {bucket.replace(tzinfo=None): (added, removed) for bucket, added, removed in rows}
+    total = db.session.query(SignatureCount.total).filter_by(campaign=slug).scalar() or 0
+
+    series = []
+    for i in reversed(range(points)):
+        start = first + i * step
+        added, removed = changes.get(start, (0, 0))
+        series.append({"start": start.isoformat() + "Z", "added": added, "removed": removed, "total": total})
+        total -= added - removed
+    series.reverse()
+    return series
+
+
+def chart_points(series, width, height):
+    """ SVG polyline points of the totals of a series, scaled to width and height """
+    if not series:
+        return ""
+    low = min(point["total"] for point in series)
+    high = max(point["total"] for point in series)
+    span = (high - low) or 1
+    step = width / max(len(series) - 1, 1)
+    return " ".join(
+        f"{i * step:.1f},{height - (point['total'] - low) / span * height:.1f}"
+        for i, point in enumerate(series)
+    )
@@ -1,69 +1,69 @@
 import os
+import hmac
+import atexit
 import re
 import datetime
+import functools
+from types import MappingProxyType
 from datetime import timedelta
-from io import BytesIO
-import tomllib
-from flask import Flask
+import click
+from flask import Flask, Blueprint, current_app
 from flask import make_response
 from flask import request, session
-from flask import redirect, render_template
-from flask import send_from_directory, send_file
+from flask import redirect, render_template, flash, get_flashed_messages
+from flask import send_from_directory, send_file, jsonify
 from markupsafe import escape
+from werkzeug.wsgi import ClosingIterator
 from waitress import serve
-import orcid
-from pyexcel_ods3 import save_data
-from feedgen.feed import FeedGenerator
 
 import config
-from db_models import db, Signatory, Admin, Campaign, UserRole, Block
-from utils import get_orcid_name, checksum
+from db_models import db, Signatory, Admin, Campaign, UserRole, Block, SignatureCount, Milestone
+from utils import get_orcid_name, checksum, campaign_excerpt
+from orcid_client import OrcidClient
+from counters import get_counts, adjust_counts, delete_counts, reconcile_counts
+from listing import signatories_page
+from dashboard import campaign_stats
+from analytics import RESOLUTIONS, MAX_POINTS, growth, chart_points
+from migrations import prepare_database
+from campaign_files import sync_campaign_files
+from storage import engine_options, create_database_dir, is_sqlite, backup_sqlite
+from signatures import sign, unsign
+from ingest import IngestQueue
+import metrics
+from roles import admin_role, current_role, invalidate_role, change_roles_version
+from cache import Cache
+from validators import make_etag, last_change, not_modified, set_validators
+from feeds import CAMPAIGN_FIELDS, MILESTONE_FIELDS, site_feed, campaign_feed, feed_data, feed_response
+from exports import EXPORT_FORMATS, export_response, export_job, export_job_url, export_path, export_rows, remove_exports
+from snapshots import snapshot_response, snapshot_export, freeze, remove_snapshot
+from bulk_admin import BULK_ACTIONS, MAX_ORCIDS, parse_orcids, apply_bulk
 
 
 """ ORCID API """
-if config.orcid_member:
-    api = orcid.MemberAPI(config.client_ID, config.client_secret, sandbox=config.sandbox)
-else:
-    api = orcid.PublicAPI(config.client_ID, config.client_secret, sandbox=config.sandbox)
 
-if config.sandbox:
-    api._token_url = "https://sandbox.orcid.org/oauth/token"
-else:
-    api._token_url = "https://orcid.org/oauth/token"
 
-""" App configuration """
-app = Flask(__name__)
-
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_DATABASE_URI"] = config.db_URI
-app.config["SECRET_KEY"] = config.cookie_secret
-app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=2)
-app.config.from_object(__name__)
-
-""" Database """
-db.init_app(app)
-
-# Create database if it doesn't exist and add admin
-if not os.path.exists(config.dbpath):
-    print(f"Database doesn't exist. Creating new database: {config.db_URI}")
-    if not os.path.isdir(config.dbdir):
-        os.mkdir(config.dbdir)
-    with app.app_context():
-        db.create_all()
-        # get admin name from orcid
-        name = get_orcid_name(api, config.admin_orcid)
-        admin = Admin(orcid=config.admin_orcid, name=name, role_id=3)
-        db.session.add(admin)
-        db.session.commit()
+@functools.cache
+def orcid_api():
+    # OAuth client for signing in, created on first use: the orcid package is slow to import
+    import orcid
+    if config.orcid_member:
+        api = orcid.MemberAPI(config.client_ID, config.client_secret, sandbox=config.sandbox)
+    else:
+        api = orcid.PublicAPI(config.client_ID, config.client_secret, sandbox=config.sandbox)
+    api._token_url = config.orcid_token_url
+    return api
 
-        for role_name in ("User", "Editor", "Administrator"):
-            role = UserRole(name=role_name)
-            db.session.add(role)
 
-        db.session.commit()
+@functools.cache
+def login_url(redirect_uri, state=None):
+    return orcid_api().get_login_url(scope="/authenticate", redirect_uri=redirect_uri, state=state)
 
-""" Read files in Campaigns and add to database if they don't already exist """
-files = os.listdir(config.campaigndir)
+
+# Client used to read the public names of ORCID iDs, created by create_app()
+orcid_client = None
+
+""" App configuration """
+bp = Blueprint("signatories", __name__, cli_group=None)
 
 reserved_actions = [
     "logout",
@@ -76,33 +76,9 @@ reserved_actions = [
     "user-banned",
     "feed",
     "feeds",
+    "metrics",
 ]
 
-for file in files:
-    with open(os.path.join(config.campaigndir, file), "rb") as f:
-        data = tomllib.load(f)
-        with app.app_context():
-            result = Campaign.query.filter_by(action_slug=data["ACTION_SLUG"]).first()
-            reserved_actions.append(data["ACTION_SLUG"])
-            if not result:
-                print(f"Creating new campaing for file: {file}")
-                new_campaign = Campaign(
-                    action_slug=data["ACTION_SLUG"],
-                    action_kind=data["ACTION_KIND"],
-                    action_name=data["ACTION_NAME"],
-                    action_short_description=data["ACTION_SHORT_DESCRIPTION"],
-                    action_text=data["ACTION_TEXT"],
-                    sort_alphabetical=data["SORT_ALPHABETICAL"],
-                    allow_anonymous=data["ALLOW_ANONYMOUS"],
-                )
-                db.session.add(new_campaign)
-                db.session.commit()
-
-""" Update database for any new tables """
-with app.app_context():
-    db.create_all()
-    db.session.commit()
-
 """ Default URLs """
 
 home_URI = config.site_path
@@ -113,16 +89,39 @@ signature_removed_URI = os.path.join(config.site_path, "<slug>", "signature-remo
 privacy_URI = os.path.join(config.site_path, "privacy")
 faq_URI = os.path.join(config.site_path, "faq")
 action_URI = os.path.join(config.site_path, "<slug>")
+signatories_URI = os.path.join(config.site_path, "<slug>", "signatories")
+export_URI = os.path.join(config.site_path, "<slug>", "export", "<name>")
 admin_URI = os.path.join(config.site_path, "admin")
 insufficient_privileges_URI = os.path.join(config.site_path, "insufficient-privileges")
 create_URI = os.path.join(config.site_path, "create")
 editor_URI = os.path.join(config.site_path, "editor")
 edit_URI = os.path.join(config.site_path, "<slug>", "edit")
 banned_URI = os.path.join(config.site_path, "user-banned")
+campaign_feed_URI = os.path.join(config.site_path, "<slug>", "feed")
+analytics_URI = os.path.join(config.site_path, "<slug>", "analytics")
+analytics_data_URI = os.path.join(config.site_path, "<slug>", "analytics", "data")
+metrics_URI = os.path.join(config.site_path, "metrics")
 
 action_template = "action-with-sidebar.html"  # default template for actions
 
-base_data = {
+# Rendered campaign pages of visitors without editing rights, by slug. Entries
+# are removed whenever the campaign or its signatures change.
+page_cache = Cache(maxsize=config.page_cache_size, ttl=config.page_cache_ttl)
+
+
+def invalidate_pages(campaigns):
+    for slug in campaigns:
+        page_cache.delete(slug)
+        remove_snapshot(slug)
+
+
+# Signatures accepted by the user page and not yet written to the database,
+# when the ingest queue is enabled; created by create_app()
+ingest_queue = None
+
+# Template variables shared by all pages. They are Jinja globals, and never
+# change: everything specific to a request or a user is passed to render_template.
+base_data = MappingProxyType({
     "home_uri": home_URI,
     "logout_uri": logout_URI,
     "user_uri": user_URI,
@@ -133,9 +132,6 @@ base_data = {
     "admin_uri": admin_URI,
     "create_uri": create_URI,
     "editor_uri": editor_URI,
-    "user_URI_defined": None,
-    "thank_you_URI_defined": None,
-    "signature_removed_URI_defined": None,
     "signatories_url": config.signatories_url,
     "footer_url_name": config.footer_url_name,
     "footer_url": config.footer_url,
@@ -143,15 +139,16 @@ base_data = {
     "thank_prc": config.thank_prc,
     "contact_email": config.contact_email,
     "orcid_url": config.orcid_url,
-    "authorization_uri_admin": api.get_login_url(
-        scope="/authenticate",
-        redirect_uri=config.code_callback_URI + "-admin"),
-    "redirect_alerts": None,
     "role_id": 0,
     "everyone_is_editor": config.everyone_is_editor,
     "site_description": config.site_description,
     "background_image": config.background,
-}
+})
+
+# Snapshots of closed campaigns are only served while the pages they froze
+# would be rendered the same way
+snapshot_version = make_etag("snapshot", sorted(base_data.items()), config.signatories_page_size,
+                             config.code_callback_URI, config.client_ID)
 
 base_alerts = {
     "success": None,
@@ -161,42 +158,73 @@ base_alerts = {
 }
 
 
+def flash_alerts(**alerts):
+    # Show alerts on the next page of this user, after a redirect
+    for category, message in alerts.items():
+        if message is not None:
+            flash(message, category)
+
+
+def pending_alerts():
+    # Alerts flashed by the previous request of this user, over the default alerts
+    alerts = base_alerts.copy()
+    for category, message in get_flashed_messages(with_categories=True):
+        alerts[category] = message
+    return alerts
+
+
 """ Routes """
 
 
-@app.route('/favicon.ico')
+@bp.app_context_processor
+def login_urls():
+    return {"authorization_uri_admin": login_url(config.code_callback_URI + "-admin")}
+
+
+@bp.route('/favicon.ico')
 def favicon():
     return send_from_directory(
-        os.path.join(app.root_path, 'static/img'),
+        os.path.join(current_app.root_path, 'static/img'),
         config.favicon, mimetype='image/vnd.microsoft.icon')
 
 
-@app.route(home_URI)
+@bp.route(home_URI)
 def home():
     # Home page
-    if session.get("orcid") is None:
-        role_id = 0
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
+    role_id = current_role()
+
+    # Let clients revalidate the page unless a campaign or its signatures changed
+    state = (
+        db.session.query(
+            db.func.count(Campaign.action_slug),
+            db.func.max(Campaign.creation_date),
+            db.func.max(Campaign.modified_date),
+            db.func.max(SignatureCount.modified_date),
+            db.func.sum(SignatureCount.version),
+        )
+        .outerjoin(SignatureCount, SignatureCount.campaign == Campaign.action_slug)
+        .filter(Campaign.is_active.is_(True))
+        .one()
+    )
+    etag = make_etag("home", role_id, *state)
+    last_modified = last_change(*state[1:4])
+    if (response := not_modified(etag, last_modified)) is not None:
+        return response
 
     campaign_list = dict()
-    # Create list of signatory campaigns
-    for row in Campaign.query.filter_by(is_active=True).order_by(Campaign.creation_date.desc()).all():
-        excerpt = row.action_short_description + '. ' + row.action_text
-        total_signatures = len(Signatory.query.filter_by(campaign=row.action_slug).all())
-        campaign_list[row.action_slug] = [
-            row.action_name, excerpt,
-            os.path.join(config.site_path, row.action_slug), row.creation_date, total_signatures]
+    # Create list of signatory campaigns, with their stored excerpts and signature counters
+    for slug, name, excerpt, creation_date, total_signatures in (
+            db.session.query(Campaign.action_slug, Campaign.action_name, Campaign.excerpt,
+                             Campaign.creation_date, SignatureCount.total)
+            .outerjoin(SignatureCount, SignatureCount.campaign == Campaign.action_slug)
+            .filter(Campaign.is_active.is_(True))
+            .order_by(Campaign.creation_date.desc())
+            .all()):
+        if total_signatures is None:
+            total_signatures = 0
+        campaign_list[slug] = [
+            name, excerpt or '',
+            os.path.join(config.site_path, slug), creation_date, total_signatures]
     data = {
         "header_title": config.site_title,
         "header_subtitle": config.site_subtitle,
@@ -205,38 +233,25 @@ def home():
         "page": "home",
         "role_id": role_id,
     }
-    base_data["user_URI_defined"] = None
-    base_data["thank_you_URI_defined"] = None
-    base_data["signature_removed_URI_defined"] = None
+    response = make_response(render_template("index.html", **data))
+    return set_validators(response, etag, last_modified)
 
-    return render_template("index.html", **(base_data | data))
 
-
-@app.route(action_URI, methods=["POST", "GET"])
+@bp.route(action_URI, methods=["POST", "GET"])
 def action(slug):
-    can_edit = False
     # Show the campaign
-    if session.get("orcid") is None:
-        role_id = 0
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-            if role_id == 3:
-                can_edit = True
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
-            if role_id == 3:
-                can_edit = True
-
-    # Get the ORCID authentication URI
-    URI = api.get_login_url(scope="/authenticate", redirect_uri=config.code_callback_URI)
+    role_id = current_role()
+    can_edit = role_id == 3
+
+    # Closed campaigns are served from their snapshot, without reading the database
+    if config.snapshots:
+        response = None
+        if request.method == "GET" and role_id == 0:
+            response = snapshot_response(slug, snapshot_version)
+        elif request.method == "POST" and (mode := request.form.get("mode", "")).startswith("download-"):
+            response = snapshot_export(slug, mode[len("download-"):], snapshot_version)
+        if response is not None:
+            return response
 
     # check if the campaign exists
     result = Campaign.query.filter_by(action_slug=slug).first()
@@ -246,38 +261,43 @@ def action(slug):
             "header_subtitle": config.site_subtitle,
             "header_path": config.site_path,
         }
-        return render_template("campaign-not-found.html", **(base_data | data))
+        return render_template("campaign-not-found.html", **data)
 
     # For editors, check if the user is the job announcement owner
     if role_id == 2:
         if result.owner_orcid == session["orcid"]:
             can_edit = True
 
-    action_data = Campaign.query.filter_by(action_slug=slug).first()
-
-    # Create list of signatories and counts
-    total_signatures = len(Signatory.query.filter_by(campaign=slug).all())
-    anonymous_signatures = len(Signatory.query.filter_by(anonymous=True, campaign=slug).all())
-    if action_data.sort_alphabetical:
-        visible_signatures = Signatory.query.filter_by(anonymous=False, campaign=slug).order_by(Signatory.name.asc()).all()
-    else:
-        visible_signatures = Signatory.query.filter_by(anonymous=False, campaign=slug).all()
+    action_data = result
+    counts = get_counts(slug)
+
+    # The page only changes with the campaign and its signatures
+    etag = make_etag("action", slug, role_id, can_edit, counts.version,
+                     action_data.modified_date, action_data.creation_date, action_data.closed_date)
+    last_modified = last_change(action_data.modified_date, action_data.creation_date, counts.modified_date)
+    if (response := not_modified(etag, last_modified)) is not None:
+        return response
+
+    # Visitors without editing rights all see the same page, which is cached
+    # together with its ETag so that pages changed by other processes are not used
+    cacheable = request.method == "GET" and role_id < 2
+    if cacheable:
+        cached = page_cache.get(slug)
+        if cached is not None and cached[0] == etag:
+            freeze_closed(action_data, counts, role_id, last_modified, cached[1])
+            return set_validators(make_response(cached[1]), etag, last_modified)
 
     if request.method == "POST":
-        if request.form.get("mode") == "download-ods":
-            visible_signatures_list = []
-            for row in visible_signatures:
-                if row.affiliation is None:
-                    affiliation = ''
-                else:
-                    affiliation = row.affiliation
+        mode = request.form.get("mode", "")
+        if mode.startswith("download-") and mode[len("download-"):] in EXPORT_FORMATS:
+            fingerprint = export_fingerprint(action_data, counts)
+            return export_response(action_data, fingerprint, mode[len("download-"):], counts.visible)
+
+    # Get the ORCID authentication URI, which brings the user back to this campaign
+    URI = login_url(config.code_callback_URI, state=slug)
 
-                visible_signatures_list.append([row.name, affiliation, row.orcid, 'https://orcid.org/'+row.orcid])
-            ods_output = {slug: visible_signatures_list}
-            ods_bytes = BytesIO()
-            save_data(ods_bytes, ods_output)
-            ods_bytes.seek(0)  # Reset the pointer to the beginning of the file
-            return send_file(ods_bytes, as_attachment=True, download_name=slug+".ods")
+    # Create the first page of signatories
+    visible_signatures, next_page = signatories_page(action_data, config.signatories_page_size)
 
     data = {
         "site_title": config.site_title,
@@ -291,24 +311,111 @@ def action(slug):
         "action_created": action_data.creation_date,
         "action_closed": action_data.closed_date,
         "authorization_uri": URI,
-        "total_signatures": total_signatures,
-        "anonymous_signatures": anonymous_signatures,
+        "total_signatures": counts.total,
+        "anonymous_signatures": counts.anonymous,
         "visible_signatures": visible_signatures,
+        "next_page": next_page,
+        "signatories_uri": os.path.join(config.site_path, slug, "signatories"),
         "is_active": action_data.is_active,
         "allow_anonymous": action_data.allow_anonymous,
         "role_id": role_id,
         "download_uri": os.path.join(config.site_path, slug),
+        "campaign_feed_uri": os.path.join(config.site_path, slug, "feed"),
         "show_edit": can_edit,
         "edit_URL": os.path.join(config.site_path, result.action_slug, "edit"),
     }
-    base_data["user_URI_defined"] = os.path.join(config.site_path, slug, "user")
-    base_data["thank_you_URI_defined"] = os.path.join(config.site_path, slug, "thank-you")
-    base_data["signature_removed_URI_defined"] = os.path.join(config.site_path, slug, "signature-removed")
 
-    return render_template(action_template, **(base_data | data))
+    page = render_template(action_template, **data)
+    if cacheable:
+        page_cache.set(slug, (etag, page))
+    freeze_closed(action_data, counts, role_id, last_modified, page)
+    return set_validators(make_response(page), etag, last_modified)
+
+
+def snapshot_fingerprint(campaign, version):
+    # A snapshot is current while the campaign and its signatures (the version of its counters) are unchanged
+    return make_etag("snapshot", campaign.action_slug, campaign.is_active, version,
+                     campaign.modified_date, campaign.creation_date, campaign.closed_date)
+
+
+def current_snapshot_fingerprint(slug):
+    # Read the campaign on a separate connection, to see the changes committed by
+    # other requests without ending the transaction of this request
+    with db.engine.connect() as connection:
+        campaign = connection.execute(Campaign.__table__.select().where(Campaign.action_slug == slug)).first()
+        if campaign is None:
+            return None
+        version = connection.execute(db.select(SignatureCount.version).where(SignatureCount.campaign == slug)).scalar()
+    return snapshot_fingerprint(campaign, version or 0)
+
+
+def freeze_closed(campaign, counts, role_id, last_modified, page):
+    # Freeze the page that visitors see of a closed campaign
+    if not config.snapshots or campaign.is_active or role_id != 0 or request.method != "GET":
+        return
+    slug = campaign.action_slug
+    freeze(slug, snapshot_fingerprint(campaign, counts.version), snapshot_version, last_modified, page,
+           lambda: list(export_rows(campaign)), lambda: current_snapshot_fingerprint(slug))
+
+
+@bp.route(signatories_URI)
+def signatories(slug):
+    # Return a page of visible signatories as JSON, for incremental loading
+    campaign = Campaign.query.filter_by(action_slug=slug).first()
+    if not campaign:
+        return jsonify({"error": "Campaign not found."}), 404
+
+    after_id = request.args.get("after_id", type=int)
+    after_name = request.args.get("after_name")
+    rows, next_page = signatories_page(campaign, config.signatories_page_size, after_id, after_name)
+
+    return jsonify({
+        "signatories": [
+            {"name": row.name, "orcid": row.orcid, "affiliation": row.affiliation or ''}
+            for row in rows
+        ],
+        "next": next_page,
+    })
+
+
+def export_fingerprint(campaign, counts):
+    # Exports are cached until the signatures or the sort order change
+    return make_etag("export", campaign.action_slug, counts.version, campaign.sort_alphabetical)
+
+
+@bp.route(export_URI)
+def export(slug, name):
+    # Poll an export made in the background, and download it once it is ready
+    campaign = Campaign.query.filter_by(action_slug=slug).first()
+    fingerprint, _, fmt = name.partition(".")
+    if not campaign or fmt != "ods" or export_path(campaign, fingerprint, fmt) is None:
+        return page_not_found(None)
+
+    current = export_fingerprint(campaign, get_counts(slug))
+    if fingerprint != current:
+        # The signatures changed since the export was requested
+        return redirect(export_job_url(campaign, current, fmt), 303)
+
+    if (path := export_job(campaign, fingerprint, fmt)) is not None:
+        return send_file(path, mimetype=EXPORT_FORMATS[fmt], as_attachment=True, download_name=f"{slug}.{fmt}")
+
+    if request.accept_mimetypes.best == "application/json":
+        response = jsonify({"state": "pending"})
+    else:
+        data = {
+            "header_title": campaign.action_name,
+            "header_subtitle": campaign.action_kind.upper(),
+            "header_path": os.path.join(config.site_path, slug),
+            "role_id": current_role(),
+        }
+        response = make_response(render_template("export.html", **data))
+    response.status_code = 202
+    response.headers.set("Retry-After", "2")
+    response.headers.set("Cache-Control", "no-store")
+    return response
 
 
-@app.route("/authorization-code-callback", methods=["GET"])
+@bp.route("/authorization-code-callback", methods=["GET"])
 def authorize():
     # Instantiate the return code
     code = None
@@ -319,7 +426,7 @@ def authorize():
         code = escape(request.args["code"])
 
         # Exchange the security code for a token
-        token = api.get_token_from_authorization_code(code, config.code_callback_URI)
+        token = orcid_api().get_token_from_authorization_code(code, config.code_callback_URI)
 
         # Extract the ORCID and user name from the token, and set to session
         session["orcid"] = escape(token["orcid"])
@@ -330,13 +437,16 @@ def authorize():
         if len(Block.query.filter_by(orcid=session["orcid"]).all()) > 0:
             return redirect(banned_URI)
 
-        # Serve the user page
-        return redirect(base_data["user_URI_defined"])
+        # Serve the user page of the campaign the user signed in from
+        slug = request.args.get("state", "")
+        if not slug or db.session.get(Campaign, slug) is None:
+            return redirect(home_URI)
+        return redirect(os.path.join(config.site_path, slug, "user"))
 
     return "Fetching ORCID account details..."
 
 
-@app.route("/authorization-code-callback-admin", methods=["GET"])
+@bp.route("/authorization-code-callback-admin", methods=["GET"])
 def authorize_admin():
     # Instantiate the return code
     code = None
@@ -347,7 +457,7 @@ def authorize_admin():
         code = escape(request.args["code"])
 
         # Exchange the security code for a token
-        token = api.get_token_from_authorization_code(code, config.code_callback_URI+"-admin")
+        token = orcid_api().get_token_from_authorization_code(code, config.code_callback_URI+"-admin")
 
         # Extract the ORCID and user name from the token, and set to session
         session["orcid"] = escape(token["orcid"])
@@ -358,28 +468,19 @@ def authorize_admin():
         if len(Block.query.filter_by(orcid=session["orcid"]).all()) > 0:
             return redirect(banned_URI)
 
+        # The administrator of a new database is created without a name
+        if Admin.query.filter_by(orcid=session["orcid"], name='').update({"name": session["name"]}):
+            db.session.commit()
+
         return redirect(editor_URI)
 
     return "Fetching ORCID account details..."
 
 
-@app.route(privacy_URI)
+@bp.route(privacy_URI)
 def privacy():
     # Show the privacy page
-    if session.get("orcid") is None:
-        role_id = 0
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
+    role_id = current_role()
 
     data = {
         "header_title": config.site_title,
@@ -387,26 +488,13 @@ def privacy():
         "header_path": config.site_path,
         "role_id": role_id,
     }
-    return render_template("privacy.html", **(base_data | data))
+    return render_template("privacy.html", **data)
 
 
-@app.route(faq_URI)
+@bp.route(faq_URI)
 def faq():
     # Show the faq page
-    if session.get("orcid") is None:
-        role_id = 0
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
+    role_id = current_role()
 
     data = {
         "header_title": config.site_title,
@@ -414,71 +502,78 @@ def faq():
         "header_path": config.site_path,
         "role_id": role_id,
     }
-    return render_template("faq.html", **(base_data | data))
+    return render_template("faq.html", **data)
 
 
-@app.route(user_URI, methods=["POST", "GET"])
+@bp.route(user_URI, methods=["POST", "GET"])
 def user(slug):
     # Show the page allowing a logged in user to sign a campaign
     if session.get("orcid") is None:
         return redirect(home_URI)
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
-
-    user = Signatory.query.filter_by(orcid=session["orcid"], campaign=slug).first()
-    action_data = Campaign.query.filter_by(action_slug=slug).first()
+    role_id = current_role()
 
     # Default alerts
     alerts = base_alerts.copy()
 
+    action_data = Campaign.query.filter_by(action_slug=slug).first()
+    if action_data is None:
+        return page_not_found(None)
+
     # Execute when an update is pushed
     if request.method == "POST":
+        # Closed campaigns no longer accept signatures (signatures can still be removed)
+        if request.form.get("mode") == "update_info" and not action_data.is_active:
+            alerts["danger"] = f"This {action_data.action_kind.lower()} is closed and no longer accepts signatures."
+
         # Update signature information
-        if request.form.get("mode") == "update_info":
+        elif request.form.get("mode") == "update_info":
             affiliation = request.form["affiliation"]
             anonymous = request.form["anonymous"]
 
-            # The user is not yet in the database
-            if user is None:
-                user = Signatory(
-                    orcid=session["orcid"], name=session["name"], campaign=slug)
-                db.session.add(user)
-                db.session.commit()
-
-            user.affiliation = affiliation
-            if anonymous == "True":
-                user.anonymous = True
-            else:
-                user.anonymous = False
+            # With the write-behind queue, the signature is written to the database later
+            if ingest_queue is not None:
+                ingest_queue.put("sign", session["orcid"], session["name"], slug, affiliation, anonymous == "True")
+                return redirect(os.path.join(config.site_path, slug, "thank-you"))
 
+            sign(session["orcid"], session["name"], slug, affiliation, anonymous == "True")
             db.session.commit()
+            invalidate_pages([slug])
 
-            return redirect(base_data["thank_you_URI_defined"])
+            return redirect(os.path.join(config.site_path, slug, "thank-you"))
 
         # Delete all user data
         if request.form.get("mode") == "delete":
             # Check the confirmation option
             if request.form["confirmation"].lower() == "delete":
                 # Delete user account
-                Signatory.query.filter_by(orcid=session["orcid"], campaign=slug).delete()
-                # Commit to database
-                db.session.commit()
+                if ingest_queue is not None:
+                    ingest_queue.put("delete", session["orcid"], session["name"], slug)
+                else:
+                    unsign(session["orcid"], slug)
+                    # Commit to database
+                    db.session.commit()
+                    invalidate_pages([slug])
                 # Logout
-                return redirect(base_data["signature_removed_URI_defined"])
+                return redirect(os.path.join(config.site_path, slug, "signature-removed"))
             else:
                 alerts["danger"] = "Please confirm your response with \"delete\""
 
-    if user is not None:
+    # Show the changes of the user that are still in the write-behind queue. They
+    # are read first: a change applied in between is then found in the database.
+    pending = None
+    if ingest_queue is not None:
+        pending = ingest_queue.pending(session["orcid"], slug)
+    user = Signatory.query.filter_by(orcid=session["orcid"], campaign=slug).first()
+
+    if pending is not None and pending["kind"] == "sign":
+        in_database = True
+        affiliation = pending["affiliation"]
+        anonymous = pending["anonymous"]
+    elif pending is not None:
+        in_database = False
+        affiliation = ''
+        anonymous = None
+    elif user is not None:
         in_database = True
         affiliation = user.affiliation
         anonymous = user.anonymous
@@ -507,10 +602,10 @@ def user(slug):
         "page": "user",
     }
 
-    return render_template("user.html", **(base_data | data))
+    return render_template("user.html", **data)
 
 
-@app.route(admin_URI, methods=["POST", "GET"])
+@bp.route(admin_URI, methods=["POST", "GET"])
 def admin():
     # Show the admin page
 
@@ -518,21 +613,16 @@ def admin():
     if session.get("orcid") is None:
         return redirect(home_URI)
 
-    # Query database for user's ORCID
-    user = Admin.query.filter_by(orcid=session["orcid"]).first()
-    if user is None:
-        print("User is not in the Admin database")
-        return redirect(insufficient_privileges_URI)
-
     # Check if the user has sufficient permissions
-    if user.role_id < 3:
+    if current_role() < 3:
         print("Insufficient permissions to view the Admin page")
         return redirect(insufficient_privileges_URI)
 
-    role = UserRole.query.filter_by(role_id=user.role_id).first()
+    role = UserRole.query.filter_by(role_id=current_role()).first()
     modify_options = [[1, "Remove"], [2, "Editor"], [3, "Administrator"]]
     delete_options = [[1, "Delete"], [2, "Ban"], [3, "Remove ban"]]
     alerts = base_alerts.copy()
+    bulk_report = None
 
     orphans = len(Campaign.query.filter_by(action_slug='').all())
 
@@ -558,7 +648,7 @@ def admin():
                 user = Admin.query.filter_by(orcid=user_id).first()
                 if user is None and role_id > 1:
                     # Try to get public name and email from orcid profile
-                    orcid_name = get_orcid_name(api, user_id)
+                    orcid_name = get_orcid_name(orcid_client, user_id)
                     if orcid_name == '':
                         alerts["warning"] = "The ORCID user name is marked as private and will not be shown."
                     # Add new user
@@ -578,7 +668,10 @@ def admin():
                     db.session.delete(user)
                     alerts["success"] = "User deleted."
 
+                if alerts["success"]:
+                    change_roles_version()
                 db.session.commit()
+                invalidate_role(user_id)
 
         # Delete or ban user
         if request.form.get("mode") == "delete_ban_user":
@@ -593,15 +686,18 @@ def admin():
             # Check if the ORCID is valid (4 groups of 4 digits)
             elif (re.match(r"\d{4}-\d{4}-\d{4}-\d{3}[0-9|xX]", user_id.strip()) is None) or not checksum(user_id.strip()):
                 alerts["danger"] = "Invalid ORCID iD."
-            elif Admin.query.filter_by(orcid=user_id).first() is not None:
+            elif admin_role(user_id) is not None:
                 alerts["danger"] = "Can not delete, ban or unban users with administrator roles."
             else:
                 if user_option == 1:
                     result = Signatory.query.filter_by(orcid=user_id).all()
                     num_deleted = len(result)
                     if num_deleted > 0:
+                        for row in result:
+                            adjust_counts(row.campaign, total=-1, anonymous=-int(row.anonymous))
                         Signatory.query.filter_by(orcid=user_id).delete()
                         db.session.commit()
+                        invalidate_pages({row.campaign for row in result})
                         if num_deleted == 1:
                             alerts["success"] = f"Deleted {num_deleted} signature associated with ORCID iD {user_id}."
                         else:
@@ -613,7 +709,7 @@ def admin():
                     if len(Block.query.filter_by(orcid=user_id).all()) > 0:
                         alerts["info"] = f"User is already banned: {user_id}"
                     else:
-                        user = Block(orcid=user_id, name=get_orcid_name(api, user_id))
+                        user = Block(orcid=user_id, name=get_orcid_name(orcid_client, user_id))
                         db.session.add(user)
                         db.session.commit()
                         alerts["success"] = f"User banned: {user_id}"
@@ -627,14 +723,48 @@ def admin():
                     else:
                         alerts["info"] = "ORCID iD is not banned."
 
+        # Apply an action to a list of ORCID iDs, typed in or uploaded as a text file
+        if request.form.get("mode") == "bulk":
+            action = request.form.get("bulk_action")
+            text = request.form.get("user_ids", "")
+            upload = request.files.get("user_file")
+            if upload is not None and upload.filename:
+                text += "\n" + upload.read().decode("utf-8", errors="replace")
+            orcids = parse_orcids(text)
+
+            if action not in dict(BULK_ACTIONS):
+                alerts["danger"] = "Unknown bulk action."
+            elif len(orcids) == 0:
+                alerts["warning"] = "No ORCID iDs were given."
+            elif len(orcids) > MAX_ORCIDS:
+                alerts["danger"] = f"At most {MAX_ORCIDS} ORCID iDs can be processed at once."
+            else:
+                bulk_report, campaigns = apply_bulk(action, orcids, orcid_client, own_orcid=session["orcid"],
+                                                    workers=config.orcid_workers)
+                invalidate_pages(campaigns)
+                for orcid_id, status, message in bulk_report:
+                    invalidate_role(orcid_id)
+                failed = sum(1 for row in bulk_report if row[1] == "danger")
+                alerts["success"] = f"Processed {len(bulk_report) - failed} ORCID iDs ({failed} rejected)."
+
         # Download database file
         if request.form.get("mode") == "backup_db":
-            return send_file(config.dbpath, as_attachment=True)
+            if is_sqlite(config.db_URI):
+                backup_path = backup_sqlite(config.db_URI)
+                response = send_file(backup_path, as_attachment=True, download_name=config.dbname,
+                                     mimetype="application/vnd.sqlite3", conditional=False, etag=False)
+                # The copy is removed once it has been sent. Callbacks of call_on_close
+                # are not run for the file responses of send_file, which the server closes.
+                response.response = ClosingIterator(response.response, lambda: os.remove(backup_path))
+                return response
+            alerts["warning"] = "Download is only available for SQLite databases. Use export_database.py instead."
 
         # Delete database orphans
         if request.form.get("mode") == "delete_orphans":
             Campaign.query.filter_by(action_slug='').delete()
+            delete_counts('')
             db.session.commit()
+            page_cache.delete('')
             alerts["success"] = "Deleted orphan campaigns"
             orphans = 0
 
@@ -653,41 +783,33 @@ def admin():
         "role_id": role.role_id,
         "modify_options": modify_options,
         "delete_options": delete_options,
+        "bulk_options": BULK_ACTIONS,
+        "bulk_report": bulk_report,
         "alert": alerts,
         "editors": editors,
         "admins": admins,
         "blocked": blocked,
         "orphans": orphans,
+        "page_cache": page_cache.stats(),
+        "queued_signatures": ingest_queue.size() if ingest_queue is not None else None,
         "page": 'admin'
     }
 
     # Serve the admin page
-    return render_template("admin.html", **(base_data | data))
+    return render_template("admin.html", **data)
 
 
-@app.route(create_URI, methods=["POST", "GET"])
+@bp.route(create_URI, methods=["POST", "GET"])
 def create():
     # Show the page to create a campaign
     if session.get("orcid") is None:
         return redirect(home_URI)
-    elif base_data["everyone_is_editor"] is False:
-        # Query database for user's ORCID
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            print("User is not in the Admin database")
-            return redirect(insufficient_privileges_URI)
 
-        # Check if the user has sufficient permissions
-        role_id = user.role_id
-        if role_id < 2:
-            print("Insufficient permissions to view this page")
-            return redirect(insufficient_privileges_URI)
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
+    # Check if the user has sufficient permissions
+    role_id = current_role()
+    if role_id < 2:
+        print("Insufficient permissions to view this page")
+        return redirect(insufficient_privileges_URI)
 
     # Default alerts (= None)
     alerts = base_alerts.copy()
@@ -728,6 +850,7 @@ def create():
                 action_name=escape(request.form["action_name"]),
                 action_short_description=escape(request.form["action_short_description"]),
                 action_text=request.form["action_text"],
+                excerpt=campaign_excerpt(escape(request.form["action_short_description"]), request.form["action_text"]),
                 sort_alphabetical=sort_alphabetical,
                 allow_anonymous=allow_anonymous,
                 owner_orcid=session["orcid"],
@@ -752,12 +875,7 @@ def create():
                 db.session.add(new_campaign)
                 db.session.commit()
 
-                base_data["redirect_alerts"] = {
-                    "success": "Campaign created.",
-                    "danger": None,
-                    "info": None,
-                    "warning": None,
-                }
+                flash_alerts(success="Campaign created.")
                 return redirect(editor_URI)
 
     data = {
@@ -779,63 +897,33 @@ def create():
         "form_activate_campaign": new_campaign.is_active,
     }
 
-    return render_template("create.html", **(base_data | data))
+    return render_template("create.html", **data)
 
 
-@app.route(editor_URI)
+@bp.route(editor_URI)
 def editor():
     # Show the editor page with their list of campaigns
     if session.get("orcid") is None:
         return redirect(home_URI)
-    elif base_data["everyone_is_editor"] is False:
-        # Query database for user's ORCID
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            print("User is not in the Admin database")
-            return redirect(insufficient_privileges_URI)
 
-        # Check if the user has sufficient permissions
-        role_id = user.role_id
-        if role_id < 2:
-            print("Insufficient permissions to view this page")
-            return redirect(insufficient_privileges_URI)
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
+    # Check if the user has sufficient permissions
+    role_id = current_role()
+    if role_id < 2:
+        print("Insufficient permissions to view this page")
+        return redirect(insufficient_privileges_URI)
 
-    # Default alerts (= None)
-    if base_data["redirect_alerts"] is None:
-        alerts = base_alerts.copy()
-    else:
-        alerts = base_data["redirect_alerts"]
-        base_data["redirect_alerts"] = None
-
-    my_campaigns_active = dict()
-    my_campaigns_inactive = dict()
-    all_campaigns = dict()
-    # Create list of signatory campaigns
-    for row in Campaign.query.order_by(Campaign.action_name.asc()).all():
-        if row.owner_orcid == session["orcid"]:
-            if row.is_active:
-                my_campaigns_active[row.action_slug] = [
-                    row.action_name,
-                    os.path.join(config.site_path, row.action_slug),
-                ]
-            else:
-                my_campaigns_inactive[row.action_slug] = [
-                    row.action_name,
-                    os.path.join(config.site_path, row.action_slug),
-                ]
+    # Alerts of the previous page (= None if there are none)
+    alerts = pending_alerts()
 
+    # Administrators see all campaigns, editors only their own
     if role_id == 3:
-        for row in Campaign.query.order_by(Campaign.action_name.asc()).all():
-            all_campaigns[row.action_slug] = [
-                row.action_name,
-                os.path.join(config.site_path, row.action_slug),
-            ]
+        all_campaigns = campaign_stats()
+        my_campaigns = [row for row in all_campaigns if row["owner_orcid"] == session["orcid"]]
+    else:
+        all_campaigns = []
+        my_campaigns = campaign_stats(owner_orcid=session["orcid"])
+    my_campaigns_active = [row for row in my_campaigns if row["is_active"]]
+    my_campaigns_inactive = [row for row in my_campaigns if not row["is_active"]]
 
     data = {
         "header_title": session["name"],
@@ -851,36 +939,24 @@ def editor():
         "all_campaigns": all_campaigns,
     }
 
-    return render_template("editor.html", **(base_data | data))
+    return render_template("editor.html", **data)
 
 
-@app.route(edit_URI, methods=["POST", "GET"])
+@bp.route(edit_URI, methods=["POST", "GET"])
 def edit(slug):
     # Show the page to edit a specific campaign
     if session.get("orcid") is None:
         return redirect(home_URI)
-    elif base_data["everyone_is_editor"] is False:
-        # Query database for user's ORCID
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            print("User is not in the Admin database")
-            return redirect(insufficient_privileges_URI)
 
-        # Check if the user has sufficient permissions
-        role_id = user.role_id
-        if role_id < 2:
-            print("Insufficient permissions to view this page")
-            return redirect(insufficient_privileges_URI)
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
+    # Check if the user has sufficient permissions
+    role_id = current_role()
+    if role_id < 2:
+        print("Insufficient permissions to view this page")
+        return redirect(insufficient_privileges_URI)
 
     edit_campaign = Campaign.query.filter_by(action_slug=slug).first()
     if not edit_campaign:
-        return render_template("campaign-not-found.html", **(base_data))
+        return render_template("campaign-not-found.html")
 
     # For editors, check if the user is the campaign owner
     if role_id == 2:
@@ -907,6 +983,7 @@ def edit(slug):
             edit_campaign.action_name = escape(request.form["action_name"])
             edit_campaign.action_short_description = escape(request.form["action_short_description"])
             edit_campaign.action_text = request.form["action_text"]
+            edit_campaign.excerpt = campaign_excerpt(edit_campaign.action_short_description, edit_campaign.action_text)
             edit_campaign.sort_alphabetical = sort_alphabetical
             edit_campaign.allow_anonymous = allow_anonymous
 
@@ -916,13 +993,9 @@ def edit(slug):
                 alerts["danger"] = "You must enter an action kind."
             else:
                 db.session.commit()
+                invalidate_pages([slug])
 
-                base_data["redirect_alerts"] = {
-                    "success": "Campaign updated.",
-                    "danger": None,
-                    "info": None,
-                    "warning": None,
-                }
+                flash_alerts(success="Campaign updated.")
                 return redirect(editor_URI)
 
         if request.form.get("mode") == "close_activate":
@@ -937,25 +1010,17 @@ def edit(slug):
 
             edit_campaign.is_active = is_active
             db.session.commit()
+            invalidate_pages([slug])
 
-            base_data["redirect_alerts"] = {
-                "success": alert_text,
-                "danger": None,
-                "info": None,
-                "warning": None,
-            }
+            flash_alerts(success=alert_text)
             return redirect(editor_URI)
 
         if request.form.get("mode") == "reset_date":
             edit_campaign.creation_date = datetime.datetime.now(datetime.UTC)
             db.session.commit()
+            invalidate_pages([slug])
 
-            base_data["redirect_alerts"] = {
-                "success": "Campaign creation date updated.",
-                "danger": None,
-                "info": None,
-                "warning": None,
-            }
+            flash_alerts(success="Campaign creation date updated.")
             return redirect(editor_URI)
 
         if request.form.get("mode") == "change_owner":
@@ -964,12 +1029,7 @@ def edit(slug):
 
             # Check if the ORCID is valid (4 groups of 4 digits)
             if (re.match(r"\d{4}-\d{4}-\d{4}-\d{3}[0-9|xX]", user_id.strip()) is None) or not checksum(user_id.strip()):
-                base_data["redirect_alerts"] = {
-                    "success": None,
-                    "danger": "Invalid ORCID.",
-                    "info": None,
-                    "warning": None,
-                }
+                flash_alerts(danger="Invalid ORCID.")
             # All good
             else:
                 warning_alert = None
@@ -977,7 +1037,7 @@ def edit(slug):
                 user = Admin.query.filter_by(orcid=user_id).first()
                 if user is None:
                     # Try to get public name from orcid profile
-                    orcid_name = get_orcid_name(api, user_id)
+                    orcid_name = get_orcid_name(orcid_client, user_id)
                     if orcid_name == '':
                         warning_alert = "The ORCID user name is marked as private and will not be shown."
                 else:
@@ -987,12 +1047,7 @@ def edit(slug):
                 edit_campaign.owner_name = orcid_name
                 db.session.commit()
 
-                base_data["redirect_alerts"] = {
-                    "success": f"Campaign owner was changed to {user_id} ({orcid_name}).",
-                    "danger": None,
-                    "info": None,
-                    "warning": warning_alert,
-                }
+                flash_alerts(success=f"Campaign owner was changed to {user_id} ({orcid_name}).", warning=warning_alert)
 
             return redirect(editor_URI)
 
@@ -1001,13 +1056,11 @@ def edit(slug):
                 # delete campaign and all signatories
                 Campaign.query.filter_by(action_slug=slug).delete()
                 Signatory.query.filter_by(campaign=slug).delete()
+                delete_counts(slug)
                 db.session.commit()
-                base_data["redirect_alerts"] = {
-                    "success": "Campaign deleted.",
-                    "danger": None,
-                    "info": None,
-                    "warning": None,
-                }
+                invalidate_pages([slug])
+                remove_exports(slug)
+                flash_alerts(success="Campaign deleted.")
                 return redirect(editor_URI)
             else:
                 alerts["danger"] = "Please confirm your response with \"delete\"."
@@ -1034,26 +1087,87 @@ def edit(slug):
         "is_active": edit_campaign.is_active,
     }
 
-    return render_template("edit.html", **(base_data | data))
+    return render_template("edit.html", **data)
+
+
+def can_view_analytics(campaign, role_id):
+    # Administrators see the analytics of all campaigns, editors of their own
+    return role_id == 3 or (role_id == 2 and campaign.owner_orcid == session.get("orcid"))
+
+
+@bp.route(analytics_URI)
+def campaign_analytics(slug):
+    # Show the growth of a campaign per minute, hour and day
+    if session.get("orcid") is None:
+        return redirect(home_URI)
+
+    campaign = Campaign.query.filter_by(action_slug=slug).first()
+    if not campaign:
+        return render_template("campaign-not-found.html")
+
+    role_id = current_role()
+    if not can_view_analytics(campaign, role_id):
+        print("Insufficient permissions to view the analytics of this action")
+        return redirect(insufficient_privileges_URI)
+
+    charts = []
+    for resolution in RESOLUTIONS:
+        series = growth(slug, resolution)
+        charts.append({
+            "resolution": resolution,
+            "first": series[0]["start"],
+            "last": series[-1]["start"],
+            "added": sum(point["added"] for point in series),
+            "removed": sum(point["removed"] for point in series),
+            "low": min(point["total"] for point in series),
+            "high": max(point["total"] for point in series),
+            "points": chart_points(series, 600, 150),
+        })
+
+    data = {
+        "header_title": session["name"],
+        "header_subtitle": session["orcid"],
+        "header_path": editor_URI,
+        "name": session["name"],
+        "orcid_id": session["orcid"],
+        "role_id": role_id,
+        "alert": base_alerts.copy(),
+        "page": 'editor',
+        "campaign_name": campaign.action_name,
+        "campaign_path": os.path.join(config.site_path, slug),
+        "charts": charts,
+        "data_uri": os.path.join(config.site_path, slug, "analytics", "data"),
+    }
+    return render_template("analytics.html", **data)
+
+
+@bp.route(analytics_data_URI)
+def campaign_analytics_data(slug):
+    # Return the growth of a campaign as JSON, with ?resolution=minute|hour|day and ?points=N
+    campaign = Campaign.query.filter_by(action_slug=slug).first()
+    if not campaign:
+        return jsonify({"error": "Campaign not found."}), 404
+    if session.get("orcid") is None or not can_view_analytics(campaign, current_role()):
+        return jsonify({"error": "Insufficient privileges."}), 403
+
+    resolution = request.args.get("resolution", "hour")
+    points = request.args.get("points", type=int)
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": f"Unknown resolution: choose one of {', '.join(RESOLUTIONS)}."}), 400
+    if points is not None and not 1 <= points <= MAX_POINTS:
+        return jsonify({"error": f"points must be between 1 and {MAX_POINTS}."}), 400
+
+    response = jsonify({"campaign": slug, "resolution": resolution, "series": growth(slug, resolution, points)})
+    response.headers.set("Cache-Control", "no-store")
+    return response
 
 
-@app.route(thank_you_URI)
+@bp.route(thank_you_URI)
 def thank_you(slug):
     # Show page thanking the user for signing the campaign
     if session.get("orcid") is None:
         return redirect(home_URI)
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
+    role_id = current_role()
 
     action_data = Campaign.query.filter_by(action_slug=slug).first()
 
@@ -1064,35 +1178,20 @@ def thank_you(slug):
         "action_kind": action_data.action_kind,
         "role_id": role_id,
     }
-    base_data["user_URI_defined"] = None
-    base_data["thank_you_URI_defined"] = None
-    base_data["signature_removed_URI_defined"] = None
-
     # If a user session exists, close it (if admin, do nothing)
     if role_id == 0:
         session.pop("name", None)
         session.pop("orcid", None)
 
-    return render_template("thank-you.html", **(base_data | data))
+    return render_template("thank-you.html", **data)
 
 
-@app.route(signature_removed_URI)
+@bp.route(signature_removed_URI)
 def signature_removed(slug):
     # Show page confirming that the user signature was removed
     if session.get("orcid") is None:
         return redirect(home_URI)
-    elif base_data["everyone_is_editor"] is True:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is not None:
-            role_id = user.role_id
-        else:
-            role_id = 2
-    else:
-        user = Admin.query.filter_by(orcid=session["orcid"]).first()
-        if user is None:
-            role_id = 0
-        else:
-            role_id = user.role_id
+    role_id = current_role()
 
     action_data = Campaign.query.filter_by(action_slug=slug).first()
 
@@ -1103,43 +1202,35 @@ def signature_removed(slug):
         "action_kind": action_data.action_kind,
         "role_id": role_id,
     }
-    base_data["user_URI_defined"] = None
-    base_data["thank_you_URI_defined"] = None
-    base_data["signature_removed_URI_defined"] = None
-
     # If a user session exists, close it (if admin, do nothing)
     if role_id == 0:
         session.pop("name", None)
         session.pop("orcid", None)
 
-    return render_template("signature-removed.html", **(base_data | data))
+    return render_template("signature-removed.html", **data)
 
 
-@app.route(insufficient_privileges_URI)
+@bp.route(insufficient_privileges_URI)
 def insufficient_privileges():
     data = {
         "header_title": config.site_title,
         "header_subtitle": config.site_subtitle,
         "header_path": config.site_path,
     }
-    return render_template("insufficient-privileges.html", **(base_data | data))
+    return render_template("insufficient-privileges.html", **data)
 
 
-@app.route(logout_URI)
+@bp.route(logout_URI)
 def logout():
     # If a user session exists, close it
     if session.get("orcid") is not None:
         session.pop("name", None)
         session.pop("orcid", None)
 
-    base_data["user_URI_defined"] = None
-    base_data["thank_you_URI_defined"] = None
-    base_data["signature_removed_URI_defined"] = None
-
     return redirect(home_URI)
 
 
-@app.route(banned_URI)
+@bp.route(banned_URI)
 def banned():
     # If a user session exists, close it
     if session.get("orcid") is not None:
@@ -1152,49 +1243,165 @@ def banned():
             "header_path": config.site_path,
             "role_id": 0,
         }
-        return render_template("user-banned.html", **(base_data | data))
+        return render_template("user-banned.html", **data)
     else:
         return redirect(home_URI)
 
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def page_not_found(e):
     data = {
         "header_title": config.site_title,
         "header_subtitle": config.site_subtitle,
         "header_path": config.site_path,
     }
-    return render_template("404.html", **(base_data | data)), 404
+    return render_template("404.html", **data), 404
 
 
-@app.route('/feed')
+@bp.route('/feed')
 def feeds():
-    fg = FeedGenerator()
-    fg.id(os.path.join(config.signatories_url, "feed"))
-    fg.title(config.site_title)
-    fg.subtitle(config.site_subtitle)
-    fg.link(href=os.path.join(config.signatories_url, "feed"), rel='self')
-    fg.language('en')
-    fg.author(name=config.site_title)
-
-    # Create list of feed entries
-    for row in Campaign.query.filter_by(is_active=True).order_by(Campaign.creation_date.asc()).all():
-        if row.action_slug not in ['demo', 'demo-no-anonymous']:
-            fe = fg.add_entry()
-            fe.id(os.path.join(config.signatories_url, row.action_slug))
-            fe.title(row.action_name)
-            fe.summary(row.action_short_description)
-            fe.link(href=os.path.join(config.signatories_url, row.action_slug))
-            fe.published(row.creation_date.replace(tzinfo=datetime.UTC))
-            fe.content(row.action_text, type='html')
-
-    response = make_response(fg.atom_str(pretty=True))
-    response.headers.set('Content-Type', 'application/atom+xml; charset=utf-8')
+    # The feed only changes when an active campaign is added, edited or closed
+    state = (
+        db.session.query(
+            db.func.count(Campaign.action_slug),
+            db.func.max(Campaign.creation_date),
+            db.func.max(Campaign.modified_date),
+        )
+        .filter(Campaign.is_active.is_(True))
+        .one()
+    )
+
+    def arguments():
+        campaigns = Campaign.query.filter_by(is_active=True).order_by(Campaign.creation_date.asc()).all()
+        return ([feed_data(row, CAMPAIGN_FIELDS) for row in campaigns],)
+
+    return feed_response("feed", make_etag("feed", *state), last_change(*state[1:]), site_feed, arguments)
+
+
+@bp.route(campaign_feed_URI)
+def campaign_feeds(slug):
+    campaign = Campaign.query.filter_by(action_slug=slug).first()
+    if not campaign:
+        return page_not_found(None)
+
+    milestones = Milestone.query.filter_by(campaign=slug).order_by(Milestone.signatures.asc()).all()
+    reached_dates = [milestone.reached_date for milestone in milestones]
+
+    # The feed only changes when the campaign is edited or closed, or reaches a milestone
+    etag = make_etag("campaign-feed", slug, campaign.modified_date, campaign.closed_date, len(milestones))
+    last_modified = last_change(campaign.creation_date, campaign.modified_date, campaign.closed_date, *reached_dates)
+
+    def arguments():
+        return feed_data(campaign, CAMPAIGN_FIELDS), [feed_data(row, MILESTONE_FIELDS) for row in milestones]
+
+    return feed_response(("campaign-feed", slug), etag, last_modified, campaign_feed, arguments)
+
+
+@bp.route(metrics_URI)
+def metrics_view():
+    # Serve the metrics of this process to administrators and to scrapers with the metrics token
+    token = request.headers.get("Authorization", "")
+    scraper = config.metrics_token is not None and hmac.compare_digest(token, f"Bearer {config.metrics_token}")
+    if not config.metrics or not (scraper or current_role() == 3):
+        return page_not_found(None)
+
+    page_stats = page_cache.stats()
+    gauges = [
+        ("signatories_page_cache_entries", "Rendered pages in the page cache", page_stats["size"]),
+        ("signatories_page_cache_hits", "Page cache hits", page_stats["hits"]),
+        ("signatories_page_cache_misses", "Page cache misses", page_stats["misses"]),
+        ("signatories_orcid_names_cached", "ORCID names in the name cache", len(orcid_client.names)),
+    ]
+    if ingest_queue is not None:
+        gauges.append(("signatories_queued_signatures", "Signatures in the write-behind queue", ingest_queue.size()))
+
+    response = make_response(metrics.render(gauges))
+    response.headers.set("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+    response.headers.set("Cache-Control", "no-store")
     return response
 
 
+@bp.cli.command("reconcile-counts")
+def reconcile_counts_command():
+    # Recompute the signature counters of all campaigns from scratch
+    corrected = reconcile_counts()
+    invalidate_pages(corrected)
+    print(f"Signature counters corrected for {len(corrected)} campaign(s).")
+
+
+@bp.cli.command("bulk-admin")
+@click.argument("action", type=click.Choice([option[0] for option in BULK_ACTIONS]))
+@click.argument("orcid_file", type=click.File("r"))
+def bulk_admin_command(action, orcid_file):
+    # Apply an action to the ORCID iDs listed in a file ('-' for standard input)
+    report, campaigns = apply_bulk(action, parse_orcids(orcid_file.read()), orcid_client,
+                                   workers=config.orcid_workers)
+    # Snapshots of closed campaigns may list deleted signatures
+    invalidate_pages(campaigns)
+    for orcid_id, status, message in report:
+        print(f"{orcid_id}\t{status}\t{message}")
+
+
+def create_app():
+    """ Create the app, and create, upgrade and synchronise its database when needed """
+    global orcid_client, ingest_queue
+    if orcid_client is None:
+        orcid_client = OrcidClient(
+            config.client_ID,
+            config.client_secret,
+            token_url=config.orcid_token_url,
+            api_url=config.orcid_api_url,
+            timeout=config.orcid_timeout,
+            retries=config.orcid_retries,
+            name_cache_ttl=config.orcid_name_cache_ttl,
+            pool_size=max(10, config.orcid_workers),
+        )
+    if config.ingest_queue and ingest_queue is None:
+        ingest_queue = IngestQueue(config.queuepath, interval=config.ingest_interval / 1000,
+                                   batch_size=config.ingest_batch_size)
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_DATABASE_URI"] = config.db_URI
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(config.db_URI)
+    app.config["SECRET_KEY"] = config.cookie_secret
+    app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=2)
+
+    app.jinja_env.globals.update(base_data)
+
+    db.init_app(app)
+    if config.metrics:
+        metrics.init_app(app, orcid_client.session)
+    app.register_blueprint(bp)
+
+    create_database_dir(config.db_URI)
+    with app.app_context():
+        prepare_database(config.admin_orcid)
+        # Campaigns of the campaign files can not be replaced by new campaigns
+        for slug in sync_campaign_files(config.campaigndir):
+            if slug not in reserved_actions:
+                reserved_actions.append(slug)
+
+    if ingest_queue is not None:
+        ingest_queue.start(app, on_commit=invalidate_pages)
+        atexit.register(ingest_queue.stop)
+    return app
+
+
+def __getattr__(name):
+    # The app is created on first use of app.app (from app import app, flask --app app),
+    # so that importing this module has no side effects: the processes of the job pool
+    # import it when it is the main module.
+    global app
+    if name == "app":
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
+    app = create_app()
     if config.sandbox:
-        app.run(host="127.0.0.1", port=config.port, debug=True)
+        app.run(host=config.host, port=config.port, debug=True)
     else:
-        serve(app, host="127.0.0.1", port=config.port)
+        serve(app, host=config.host, port=config.port, threads=config.threads)
@@ -0,0 +1,461 @@
+""" Benchmark suite against a synthetic database
+
+Seeds a temporary database with campaigns of different sizes, drives the main
+pages through the Flask test client (or a local waitress server with --server)
+and reports latency percentiles, throughput and the peak memory of the process.
+ORCID calls are stubbed, so the benchmark runs offline and never touches
+db/signatories.db. It fails when the 95th percentile latency of the home page
+exceeds the budget.
+
+Campaigns are spread evenly over the sizes given with --signatures, and every
+campaign route is measured on one campaign of each size. --scale selects a
+preset: small (20 campaigns of 10 and 1k signers), medium (200 campaigns of 10,
+1k and 10k signers) or large (300 campaigns of 10, 1k and 100k signers).
+Counters are reconciled after seeding, as on a live site, and an ODS download
+is timed until the file is received, following the export page of campaigns
+exported in the background.
+
+The sign route submits every signature twice from concurrent threads, as a
+double-clicked form would, reports the throughput and fails if a signature was
+stored twice or the counters do not match the signatures.
+
+The startup route times the import of the app in new interpreters: once on an
+empty database, which is created, and then on the seeded database, as every
+worker does when it starts. It fails when the median start on the seeded
+database exceeds the startup budget.
+
+    python benchmark.py --campaigns 40 --signatures 1000 --budget 250
+    python benchmark.py --scale medium --routes home,action,feeds --cold
+    python benchmark.py --routes sign --signers 2000 --threads 16
+    python benchmark.py --routes startup --startup-budget 1000
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import argparse
+import functools
+import resource
+import tempfile
+import subprocess
+import datetime
+import threading
+import statistics
+
+import config
+import utils
+
+ROUTES = ["home", "action", "user", "editor", "feeds", "ods", "analytics", "sign", "startup"]
+
+SCALES = {
+    "small": (20, [10, 1000]),
+    "medium": (200, [10, 1000, 10000]),
+    "large": (300, [10, 1000, 100000]),
+}
+
+ADMIN_ORCID = "0000-0002-9999-9999"
+
+
+def seed(db, Campaign, Signatory, n_campaigns, sizes):
+    """
+    Insert synthetic campaigns and signatures using bulk inserts.
+
+    Returns the slug of the first campaign of each size.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    campaigns = [
+        {
+            "action_slug": f"campaign-{i}",
+            "action_kind": "open letter",
+            "action_name": f"Benchmark campaign {i}",
+            "action_short_description": "A synthetic campaign",
+            "action_text": "<p>" + "Lorem ipsum dolor sit amet. " * 200 + "</p>",
+            "excerpt": utils.campaign_excerpt("A synthetic campaign", "Lorem ipsum dolor sit amet. " * 200),
+            "is_active": True,
+            "allow_anonymous": True,
+            "owner_orcid": ADMIN_ORCID,
+            "creation_date": now - datetime.timedelta(days=i),
+        }
+        for i in range(n_campaigns)
+    ]
+    db.session.execute(db.insert(Campaign), campaigns)
+
+    samples = {}
+    for i, campaign in enumerate(campaigns):
+        size = sizes[i % len(sizes)]
+        samples.setdefault(size, campaign["action_slug"])
+        for start in range(0, size, 50000):
+            rows = [
+                {
+                    "orcid": f"0000-0000-{j // 10000:04d}-{j % 10000:04d}",
+                    "name": f"Signatory {j}",
+                    "campaign": campaign["action_slug"],
+                    "affiliation": "University of Benchmarks",
+                    "anonymous": random.random() < 0.2,
+                    "creation_date": now - datetime.timedelta(minutes=random.randrange(525600)),
+                }
+                for j in range(start, min(size, start + 50000))
+            ]
+            db.session.execute(db.insert(Signatory), rows)
+    db.session.commit()
+    return samples
+
+
+class TestClientTarget:
+    """ Sends requests through the Flask test client """
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def login(self, orcid, name):
+        with self.client().session_transaction() as session:
+            session["orcid"] = orcid
+            session["name"] = name
+
+    def logout(self):
+        with self.client().session_transaction() as session:
+            session.clear()
+
+    def request(self, method, path, data=None):
+        response = self.client().open(path, method=method, data=data)
+        response.get_data()
+        self.local.location = response.headers.get("Location")
+        return response.status_code
+
+
+class WaitressTarget:
+    """ Sends requests over HTTP to a waitress server running in a thread """
+
+    def __init__(self, app):
+        import requests
+        from waitress import create_server
+
+        self.app = app
+        self.requests = requests
+        self.server = create_server(app, host="127.0.0.1", port=0, threads=config.threads)
+        self.base_url = f"http://127.0.0.1:{self.server.effective_port}"
+        threading.Thread(target=self.server.run, daemon=True).start()
+        self.local = threading.local()
+
+    def client(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = self.requests.Session()
+        return self.local.session
+
+    def login(self, orcid, name):
+        # Sign a session cookie the way Flask does
+        serializer = self.app.session_interface.get_signing_serializer(self.app)
+        cookie = serializer.dumps({"orcid": orcid, "name": name})
+        self.client().cookies.set(self.app.config["SESSION_COOKIE_NAME"], cookie)
+
+    def logout(self):
+        self.client().cookies.clear()
+
+    def request(self, method, path, data=None):
+        response = self.client().request(method, self.base_url + path, data=data, allow_redirects=False)
+        self.local.location = response.headers.get("Location")
+        return response.status_code
+
+    def close(self):
+        self.server.close()
+
+
+def download(target, method, path, data=None):
+    """ Send a request, following the redirect and the polls of an export made in the background """
+    status = target.request(method, path, data)
+    while status in (202, 303):
+        if status == 303:
+            path = target.local.location
+        else:
+            time.sleep(0.05)
+        status = target.request("GET", path)
+    return status
+
+
+def measure(target, name, method, path, n, data=None, expect=200, before=None, follow=False):
+    """
+    Time n requests and return the statistics of the route.
+
+    With follow, a request is timed until its export is downloaded, including
+    the polls of exports made in the background.
+    """
+    send = functools.partial(download, target) if follow else target.request
+    send(method, path, data)  # warm up templates and connections
+    timings = []
+    start = time.perf_counter()
+    for _ in range(n):
+        if before is not None:
+            before()
+        t = time.perf_counter()
+        status = send(method, path, data)
+        timings.append((time.perf_counter() - t) * 1000)
+        if status != expect:
+            sys.exit(f"{name}: {method} {path} returned {status}")
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        "route": name,
+        "path": path,
+        "requests": n,
+        "p50": statistics.median(timings),
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+        "throughput": n / elapsed,
+    }
+
+
+def start_app(db_URI):
+    """ Import the app in a new interpreter; returns the time taken in ms """
+    env = dict(os.environ, db_URI=db_URI, ingest_queue="false")
+    script = "import time; start = time.perf_counter(); from app import app; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", script], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"startup: the app failed to start:\n{result.stderr}")
+    return float(result.stdout.split()[-1]) * 1000
+
+
+def startup(name, db_URI, n):
+    """ Start the app n times and return the statistics of the start time """
+    timings = [start_app(db_URI) for _ in range(n)]
+    quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        "route": name,
+        "path": db_URI,
+        "requests": n,
+        "p50": statistics.median(timings),
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+        "throughput": 1000 / statistics.mean(timings),
+    }
+
+
+def sign_load(app, target, args, slug):
+    """ Sign a campaign from concurrent threads, submitting every signature twice """
+    from db_models import db, Signatory
+    from counters import get_counts, compute_counts
+
+    user_path = os.path.join(config.site_path, slug, "user")
+    jobs = queue.Queue()
+    orcids = [f"0000-0002-{i // 10000:04d}-{i % 10000:04d}" for i in range(args.signers)]
+    submissions = orcids * 2
+    random.shuffle(submissions)
+    for orcid in submissions:
+        jobs.put(orcid)
+
+    failures = []
+
+    def worker():
+        while True:
+            try:
+                orcid = jobs.get_nowait()
+            except queue.Empty:
+                return
+            target.login(orcid, f"Signer {orcid}")
+            status = target.request("POST", user_path, {
+                "mode": "update_info", "affiliation": "University of Benchmarks",
+                "anonymous": "True" if orcid[-1] in "02468" else "False"})
+            if status != 302:
+                failures.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"sign: {len(submissions)} submissions from {args.threads} threads in {elapsed:.2f} s, "
+          f"{len(submissions) / elapsed:.0f} requests/s, {len(failures)} failed")
+
+    with app.app_context():
+        duplicates = (
+            db.session.query(Signatory.orcid)
+            .filter_by(campaign=slug)
+            .group_by(Signatory.orcid)
+            .having(db.func.count() > 1)
+            .count()
+        )
+        stored = Signatory.query.filter_by(campaign=slug).filter(Signatory.orcid.in_(orcids)).count()
+        counts, expected = get_counts(slug), compute_counts(slug)
+        counters_ok = (counts.total, counts.anonymous) == (expected.total, expected.anonymous)
+
+    print(f"sign: {stored} of {len(orcids)} signatures stored, {duplicates} duplicates, "
+          f"counters {'match' if counters_ok else 'do not match'}")
+
+    ok = not failures and not duplicates and stored == len(orcids) and counters_ok
+    return {
+        "route": "sign",
+        "path": user_path,
+        "requests": len(submissions),
+        "throughput": len(submissions) / elapsed,
+        "ok": ok,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), help="preset number and sizes of campaigns")
+    parser.add_argument("--campaigns", type=int, default=40, help="number of active campaigns")
+    parser.add_argument("--signatures", default="1000",
+                        help="signatures per campaign, or a comma-separated list of campaign sizes")
+    parser.add_argument("--requests", type=int, default=50, help="number of timed requests per route")
+    parser.add_argument("--routes", default=",".join(route for route in ROUTES if route != "sign"),
+                        help=f"comma-separated routes to measure, among {', '.join(ROUTES)}")
+    parser.add_argument("--cold", action="store_true",
+                        help="empty the page, feed and export caches before every request")
+    parser.add_argument("--server", action="store_true", help="send requests to a local waitress server")
+    parser.add_argument("--budget", type=float, default=250.0, help="p95 latency budget of the home page in ms")
+    parser.add_argument("--startup-budget", type=float, default=1500.0,
+                        help="median start time budget of the app on the seeded database in ms")
+    parser.add_argument("--signers", type=int, default=1000, help="new signatures in the sign route")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent threads in the sign route")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        args.campaigns, sizes = SCALES[args.scale]
+    else:
+        sizes = [int(size) for size in args.signatures.split(",")]
+    routes = args.routes.split(",")
+    if unknown := set(routes) - set(ROUTES):
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    tmpdir = tempfile.mkdtemp(prefix="signatories-benchmark-")
+
+    # Point the app at a throwaway database and stub the ORCID API
+    config.dbdir = tmpdir
+    config.dbpath = os.path.join(tmpdir, config.dbname)
+    config.db_URI = "sqlite:////" + config.dbpath
+    config.exportdir = os.path.join(tmpdir, "exports")
+    config.snapshotdir = os.path.join(tmpdir, "snapshots")
+    config.queuepath = os.path.join(tmpdir, "ingest-queue.db")
+    utils.get_orcid_name = lambda client, orcid: "Benchmark Admin"
+
+    start = time.perf_counter()
+    from app import app, page_cache
+    from feeds import feed_cache
+    from db_models import db, Admin, Campaign, Signatory
+    from analytics import rebuild_rates
+    from counters import reconcile_counts
+    print(f"Started the app in {time.perf_counter() - start:.2f} s")
+
+    with app.app_context():
+        start = time.perf_counter()
+        samples = seed(db, Campaign, Signatory, args.campaigns, sizes)
+        db.session.add(Admin(orcid=ADMIN_ORCID, name="Benchmark Admin", role_id=3))
+        db.session.commit()
+        reconcile_counts()
+        rebuild_rates()
+        print(f"Seeded {args.campaigns} campaigns of {', '.join(map(str, sizes))} signatures "
+              f"in {time.perf_counter() - start:.1f} s")
+
+    target = WaitressTarget(app) if args.server else TestClientTarget(app)
+
+    def clear_caches():
+        page_cache.clear()
+        feed_cache.clear()
+        shutil.rmtree(config.exportdir, ignore_errors=True)
+        shutil.rmtree(config.snapshotdir, ignore_errors=True)
+
+    before = clear_caches if args.cold else None
+    results = []
+    failed = False
+    n = args.requests
+
+    for route in routes:
+        if route == "home":
+            target.logout()
+            results.append(measure(target, "home", "GET", config.site_path, n, before=before))
+        elif route == "editor":
+            target.login(ADMIN_ORCID, "Benchmark Admin")
+            results.append(measure(target, "editor", "GET", os.path.join(config.site_path, "editor"), n))
+            target.logout()
+        elif route == "sign":
+            result = sign_load(app, target, args, samples[min(sizes)])
+            failed = failed or not result["ok"]
+            results.append(result)
+        elif route == "startup":
+            results.append(startup("startup (new db)", "sqlite:////" + os.path.join(tmpdir, "startup.db"), 1))
+            results.append(startup("startup", config.db_URI, max(1, min(n, 5))))
+        else:
+            for size, slug in sorted(samples.items()):
+                campaign_path = os.path.join(config.site_path, slug)
+                name = f"{route} ({size})"
+                if route == "action":
+                    target.logout()
+                    results.append(measure(target, name, "GET", campaign_path, n, before=before))
+                elif route == "user":
+                    target.login(ADMIN_ORCID, "Benchmark Admin")
+                    results.append(measure(target, name, "GET", os.path.join(campaign_path, "user"), n))
+                    target.logout()
+                elif route == "analytics":
+                    target.login(ADMIN_ORCID, "Benchmark Admin")
+                    results.append(measure(target, name, "GET",
+                                           os.path.join(campaign_path, "analytics", "data") + "?resolution=day", n))
+                    target.logout()
+                elif route == "feeds":
+                    results.append(measure(target, name, "GET", os.path.join(campaign_path, "feed"), n,
+                                           before=before))
+                elif route == "ods":
+                    results.append(measure(target, name, "POST", campaign_path, max(1, n // 10),
+                                           data={"mode": "download-ods"}, before=before, follow=True))
+            if route == "feeds":
+                results.append(measure(target, "feeds (site)", "GET", "/feed", n, before=before))
+
+    if args.server:
+        target.close()
+
+    print(f"\n{'route':<20} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for result in results:
+        if "p50" in result:
+            print(f"{result['route']:<20} {result['requests']:>8} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                  f"{result['p99']:>9.1f} {result['throughput']:>8.0f}")
+        else:
+            print(f"{result['route']:<20} {result['requests']:>8} {'':>9} {'':>9} {'':>9} {result['throughput']:>8.0f}")
+    rss = peak_rss_mb()
+    print(f"\nPeak RSS: {rss:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scale": {"campaigns": args.campaigns, "sizes": sizes}, "cold": args.cold,
+                       "server": args.server, "peak_rss_mb": rss, "results": results}, f, indent=2)
+
+    home = next((result for result in results if result["route"] == "home"), None)
+    if home is not None:
+        print(f"home: p50 {home['p50']:.1f} ms, p95 {home['p95']:.1f} ms (budget {args.budget:.0f} ms)")
+        if home["p95"] > args.budget:
+            print("Home page latency budget exceeded.")
+            failed = True
+    start_up = next((result for result in results if result["route"] == "startup"), None)
+    if start_up is not None:
+        print(f"startup: p50 {start_up['p50']:.0f} ms (budget {args.startup_budget:.0f} ms)")
+        if start_up["p50"] > args.startup_budget:
+            print("Startup time budget exceeded.")
+            failed = True
+    if failed:
+        print("Benchmark failed.")
+        sys.exit(1)
+
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
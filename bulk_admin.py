@@ -0,0 +1,171 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from db_models import db, Admin, Block, Signatory
+from counters import adjust_counts
+from roles import change_roles_version
+from utils import get_orcid_name, checksum
+
+# Bulk actions offered on the admin page, with the role_id set by the role actions
+BULK_ACTIONS = [
+    ["delete-ban", "Delete signatures and ban"],
+    ["ban", "Ban"],
+    ["unban", "Remove ban"],
+    ["delete", "Delete signatures"],
+    ["editor", "Add as editor"],
+    ["administrator", "Add as administrator"],
+    ["remove", "Remove access permissions"],
+]
+ROLE_ACTIONS = {"remove": 1, "editor": 2, "administrator": 3}
+
+# Maximum number of ORCID iDs in one bulk request
+MAX_ORCIDS = 10000
+
+# Number of values in one IN (...) clause, below the SQLite limit on bound parameters
+CHUNK_SIZE = 500
+
+ORCID_PATTERN = re.compile(r"\d{4}-\d{4}-\d{4}-\d{3}[0-9X]")
+SEPARATORS = re.compile(r"[\s,;]+")
+ORCID_PREFIX = re.compile(r"^https?://(sandbox\.)?orcid\.org/", re.IGNORECASE)
+
+
+def parse_orcids(text):
+    """ Return the unique ORCID iDs of a text, in order, accepting ORCID URLs """
+    orcids = (ORCID_PREFIX.sub("", token).upper() for token in SEPARATORS.split(text))
+    return list(dict.fromkeys(orcid for orcid in orcids if orcid))
+
+
+def valid_orcid(orcid):
+    return ORCID_PATTERN.fullmatch(orcid) is not None and checksum(orcid)
+
+
+def chunked(values):
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+
+def rows_for(model, column, orcids):
+    """ Return the rows of model whose column is one of orcids """
+    return [row for chunk in chunked(orcids) for row in model.query.filter(column.in_(chunk)).all()]
+
+
+def resolve_names(client, orcids, workers):
+    """ Read the public names of ORCID iDs, with at most workers requests at a time """
+    if not orcids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(orcids))) as pool:
+        return dict(zip(orcids, pool.map(lambda orcid: get_orcid_name(client, orcid), orcids)))
+
+
+def apply_bulk(action, orcids, client, own_orcid=None, workers=8):
+    """
+    Apply a bulk action to a list of ORCID iDs in a single transaction.
+
+    Names of new administrators, editors and banned users are read from ORCID
+    concurrently before anything is written. Returns the report, a list of
+    (orcid, status, message) where status is an alert level, and the set of
+    campaigns whose signatures changed.
+    """
+    report = {}
+    valid = []
+    for orcid in orcids:
+        if orcid == own_orcid:
+            report[orcid] = ("danger", "You cannot modify your own account.")
+        elif not valid_orcid(orcid):
+            report[orcid] = ("danger", "Invalid ORCID iD.")
+        else:
+            valid.append(orcid)
+
+    admins = {user.orcid: user for user in rows_for(Admin, Admin.orcid, valid)}
+    campaigns = set()
+
+    if action in ROLE_ACTIONS:
+        role_id = ROLE_ACTIONS[action]
+        names = {}
+        if role_id > 1:
+            names = resolve_names(client, [orcid for orcid in valid if orcid not in admins], workers)
+
+        for orcid in valid:
+            user = admins.get(orcid)
+            if user is None and role_id == 1:
+                report[orcid] = ("warning", "User does not exist and can not be deleted.")
+            elif user is None:
+                db.session.add(Admin(orcid=orcid, name=names[orcid], role_id=role_id))
+                if names[orcid] == '':
+                    report[orcid] = ("success", "New user added. The ORCID user name is private and will not be shown.")
+                else:
+                    report[orcid] = ("success", f"New user added: {names[orcid]}.")
+            elif role_id == 1:
+                db.session.delete(user)
+                report[orcid] = ("success", "User deleted.")
+            elif user.role_id == role_id:
+                report[orcid] = ("info", "User role did not need to be modified.")
+            else:
+                user.role_id = role_id
+                report[orcid] = ("success", "User role modified.")
+
+        if any(status == "success" for status, message in report.values()):
+            change_roles_version()
+        db.session.commit()
+        return [(orcid, *report[orcid]) for orcid in orcids], campaigns
+
+    targets = []
+    for orcid in valid:
+        if orcid in admins:
+            report[orcid] = ("danger", "Can not delete, ban or unban users with administrator roles.")
+        else:
+            targets.append(orcid)
+
+    messages = {orcid: [] for orcid in targets}
+    changed = set()
+
+    blocked = {row.orcid for row in rows_for(Block, Block.orcid, targets)}
+    names = {}
+    if action in ("ban", "delete-ban"):
+        names = resolve_names(client, [orcid for orcid in targets if orcid not in blocked], workers)
+
+    if action in ("delete", "delete-ban"):
+        signatures = rows_for(Signatory, Signatory.orcid, targets)
+        deleted = dict.fromkeys(targets, 0)
+        deltas = {}
+        for row in signatures:
+            deleted[row.orcid] += 1
+            total, anonymous = deltas.get(row.campaign, (0, 0))
+            deltas[row.campaign] = (total + 1, anonymous + int(row.anonymous))
+        for slug, (total, anonymous) in deltas.items():
+            adjust_counts(slug, total=-total, anonymous=-anonymous)
+        for chunk in chunked(targets):
+            Signatory.query.filter(Signatory.orcid.in_(chunk)).delete(synchronize_session=False)
+        campaigns.update(deltas)
+
+        for orcid, count in deleted.items():
+            if count > 0:
+                changed.add(orcid)
+                messages[orcid].append(f"Deleted {count} signature{'s' if count > 1 else ''}.")
+            else:
+                messages[orcid].append("No signatures to delete.")
+
+    if action in ("ban", "delete-ban"):
+        for orcid in targets:
+            if orcid in blocked:
+                messages[orcid].append("User is already banned.")
+            else:
+                db.session.add(Block(orcid=orcid, name=names[orcid]))
+                changed.add(orcid)
+                messages[orcid].append("User banned.")
+
+    if action == "unban":
+        for chunk in chunked([orcid for orcid in targets if orcid in blocked]):
+            Block.query.filter(Block.orcid.in_(chunk)).delete(synchronize_session=False)
+        for orcid in targets:
+            if orcid in blocked:
+                changed.add(orcid)
+                messages[orcid].append("Ban removed.")
+            else:
+                messages[orcid].append("ORCID iD is not banned.")
+
+    db.session.commit()
+
+    for orcid in targets:
+        report[orcid] = ("success" if orcid in changed else "info", " ".join(messages[orcid]))
+    return [(orcid, *report[orcid]) for orcid in orcids], campaigns
@@ -0,0 +1,69 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class Cache:
+    """
+    Thread-safe in-process cache.
+
+    The cache holds at most maxsize entries, evicting the least recently used
+    one when full. When ttl is given, entries expire ttl seconds after they
+    were stored. Hits and misses are counted for monitoring.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.ttl is None:
+            expires = None
+        else:
+            expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """ Return the size and hit/miss counts of the cache """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,64 @@
+""" Campaigns defined in the TOML files of the campaigns directory
+
+The campaign of a file is created when it does not exist in the database.
+The size, modification time and hash of every file read are stored in the
+database, so that unchanged files are not read and parsed again at the next
+start; a single query then checks that their campaigns still exist.
+"""
+import os
+import hashlib
+import tomllib
+
+from db_models import db, Campaign, CampaignFile
+from utils import campaign_excerpt
+
+
+def sync_campaign_files(directory):
+    """ Create the missing campaigns of the files in directory; returns the slugs of all files """
+    known = {row.file: row for row in CampaignFile.query.all()}
+    files = {}
+
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        row = known.get(entry.name)
+        if row is not None and row.mtime_ns == stat.st_mtime_ns and row.size == stat.st_size:
+            files[row.slug] = (entry.path, None)
+            continue
+
+        with open(entry.path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if row is not None and row.sha256 == digest:
+            # Touched, but not modified
+            row.mtime_ns = stat.st_mtime_ns
+            files[row.slug] = (entry.path, None)
+            continue
+
+        data = tomllib.loads(content.decode())
+        files[data["ACTION_SLUG"]] = (entry.path, data)
+        db.session.merge(CampaignFile(file=entry.name, slug=data["ACTION_SLUG"], mtime_ns=stat.st_mtime_ns,
+                                      size=stat.st_size, sha256=digest))
+
+    existing = {slug for (slug,) in db.session.query(Campaign.action_slug).filter(Campaign.action_slug.in_(files))}
+    for slug, (path, data) in files.items():
+        if slug in existing:
+            continue
+        if data is None:
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        print(f"Creating new campaing for file: {os.path.basename(path)}")
+        db.session.add(Campaign(
+            action_slug=data["ACTION_SLUG"],
+            action_kind=data["ACTION_KIND"],
+            action_name=data["ACTION_NAME"],
+            action_short_description=data["ACTION_SHORT_DESCRIPTION"],
+            action_text=data["ACTION_TEXT"],
+            excerpt=campaign_excerpt(data["ACTION_SHORT_DESCRIPTION"], data["ACTION_TEXT"]),
+            sort_alphabetical=data["SORT_ALPHABETICAL"],
+            allow_anonymous=data["ALLOW_ANONYMOUS"],
+        ))
+
+    db.session.commit()
+    return list(files)
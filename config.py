@@ -4,6 +4,18 @@ from dotenv import load_dotenv
 load_dotenv()
 
 port = os.getenv('port')
+host = os.getenv("host", "127.0.0.1")
+# Threads of the waitress server, each serving one request at a time
+threads = int(os.getenv("threads", 8))
+# Processes started by serve.py, requests served by a process before it is replaced
+# (0 for never, plus a random number up to max_requests_jitter), seconds given to
+# the requests in progress when a process stops, and seconds without a status
+# update after which a process is killed
+workers = int(os.getenv("workers", os.cpu_count() or 1))
+max_requests = int(os.getenv("max_requests", 0))
+max_requests_jitter = int(os.getenv("max_requests_jitter", 0))
+graceful_timeout = int(os.getenv("graceful_timeout", 30))
+worker_timeout = int(os.getenv("worker_timeout", 60))
 sandbox = True
 
 site_path = os.getenv("site_path")
@@ -36,11 +48,27 @@ if orcid_member == 1:
     orcid_member = True
 else:
     orcid_member = False
+
+# ORCID API endpoints, and limits of the calls made to read public records
+if sandbox:
+    orcid_token_url = os.getenv("orcid_token_url", "https://sandbox.orcid.org/oauth/token")
+    orcid_api_url = os.getenv("orcid_api_url", "https://pub.sandbox.orcid.org/v3.0")
+else:
+    orcid_token_url = os.getenv("orcid_token_url", "https://orcid.org/oauth/token")
+    orcid_api_url = os.getenv("orcid_api_url", "https://pub.orcid.org/v3.0")
+orcid_timeout = float(os.getenv("orcid_timeout", 5))
+orcid_retries = int(os.getenv("orcid_retries", 2))
+orcid_name_cache_ttl = int(os.getenv("orcid_name_cache_ttl", 86400))
+# Number of ORCID names read at the same time by bulk admin operations
+orcid_workers = int(os.getenv("orcid_workers", 8))
 if os.getenv("everyone_is_editor").lower() == "true":
     everyone_is_editor = True
 else:
     everyone_is_editor = False
 
+# Number of seconds the role of a user is cached before reading it again from the database
+role_cache_ttl = int(os.getenv("role_cache_ttl", 60))
+
 
 # Database
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -48,7 +76,65 @@ campaigndir = os.path.join(basedir, "campaigns")
 dbdir = os.path.join(basedir, "db")
 dbname = "signatories.db"
 dbpath = os.path.abspath(os.path.join(dbdir, dbname))
-db_URI = "sqlite:////" + dbpath
+db_URI = os.getenv("db_URI", "sqlite:////" + dbpath)
+
+# Connection pool of the database engine
+db_pool_size = int(os.getenv("db_pool_size", 10))
+db_max_overflow = int(os.getenv("db_max_overflow", 10))
+db_pool_timeout = int(os.getenv("db_pool_timeout", 30))
+db_pool_recycle = int(os.getenv("db_pool_recycle", 1800))
+
+# SQLite settings: journal mode, durability, milliseconds to wait for locks and memory-mapped I/O size in bytes
+sqlite_journal_mode = os.getenv("sqlite_journal_mode", "wal")
+sqlite_synchronous = os.getenv("sqlite_synchronous", "normal")
+sqlite_busy_timeout = int(os.getenv("sqlite_busy_timeout", 5000))
+sqlite_mmap_size = int(os.getenv("sqlite_mmap_size", 268435456))
+
+# Queue signatures in a local file and write them to the database in batches,
+# every ingest_interval milliseconds and at most ingest_batch_size at a time
+if os.getenv("ingest_queue", "false").lower() == "true":
+    ingest_queue = True
+else:
+    ingest_queue = False
+ingest_interval = int(os.getenv("ingest_interval", 200))
+ingest_batch_size = int(os.getenv("ingest_batch_size", 500))
+queuepath = os.path.join(dbdir, "ingest-queue.db")
+
+# Health of the processes started by serve.py, one status file per process
+statusdir = os.path.join(dbdir, "workers")
+
+# Days of signing rates kept per minute and per hour (per day rates are kept forever)
+analytics_minute_days = int(os.getenv("analytics_minute_days", 2))
+analytics_hour_days = int(os.getenv("analytics_hour_days", 90))
+
+# Request, SQL and ORCID timing served on /metrics to administrators, or to
+# scrapers sending "Authorization: Bearer <metrics_token>"
+if os.getenv("metrics", "true").lower() == "true":
+    metrics = True
+else:
+    metrics = False
+metrics_token = os.getenv("metrics_token")
+
+# Print requests and SQL queries slower than these thresholds in milliseconds (0 to disable)
+slow_request_ms = int(os.getenv("slow_request_ms", 0))
+slow_query_ms = int(os.getenv("slow_query_ms", 0))
+
+# Cached signatory exports
+exportdir = os.path.join(basedir, "cache", "exports")
+
+# Serve closed campaigns from snapshots: static copies of their page and exports
+if os.getenv("snapshots", "true").lower() == "true":
+    snapshots = True
+else:
+    snapshots = False
+snapshotdir = os.path.join(basedir, "cache", "snapshots")
+
+# Processes building ODS exports and feeds (0 to build them in the request thread),
+# and number of signatories above which an ODS export is made in the background
+# while the browser waits on a page that reloads until the file is ready
+job_workers = int(os.getenv("job_workers", 2))
+export_async_rows = int(os.getenv("export_async_rows", 20000))
+
 if os.getenv("show_examples").lower() == "true":
     show_examples = True
 else:
@@ -67,6 +153,13 @@ if os.getenv("show_examples").lower() == "true":
 else:
     show_examples = False
 
+# Number of signatories shown at once on a campaign page
+signatories_page_size = int(os.getenv("signatories_page_size", 100))
+
+# Number of rendered campaign pages kept in memory, and for how many seconds
+page_cache_size = int(os.getenv("page_cache_size", 256))
+page_cache_ttl = int(os.getenv("page_cache_ttl", 300))
+
 
 # Default parameters for the footer
 footer_url_name = os.getenv("footer_url_name")
@@ -0,0 +1,128 @@
+import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from db_models import db, Signatory, SignatureCount, Milestone
+from analytics import record_rate, delete_rates
+from storage import upsert_insert
+
+# Signature counts announced in the campaign feeds
+MILESTONES = {int(k * 10**e) for e in range(1, 7) for k in (1, 2.5, 5)}
+
+
+def get_counts(slug):
+    """ Return the signature counters of a campaign (zero if there are none yet) """
+    counts = db.session.get(SignatureCount, slug)
+    if counts is None:
+        counts = SignatureCount(campaign=slug, total=0, anonymous=0, visible=0, version=0)
+    return counts
+
+
+def adjust_counts(slug, total=0, anonymous=0):
+    """
+    Add the signature changes of a campaign to its counters.
+
+    This must be called in the same transaction as the change to the
+    Signatory table, before the commit. The update is done in SQL so that
+    concurrent requests do not overwrite each other's increments. If the
+    campaign has no counters yet, they are computed from the Signatory table,
+    which already includes the pending change; if a concurrent transaction
+    creates them first, the change is added to its counters instead.
+
+    Every call also marks the signatures as changed, even when the counts
+    stay the same (for instance when only the affiliation was modified).
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    increment = {
+        SignatureCount.total: SignatureCount.total + total,
+        SignatureCount.anonymous: SignatureCount.anonymous + anonymous,
+        SignatureCount.visible: SignatureCount.visible + total - anonymous,
+        SignatureCount.version: SignatureCount.version + 1,
+        SignatureCount.modified_date: now,
+    }
+    counters = SignatureCount.query.filter_by(campaign=slug)
+
+    if counters.update(increment, synchronize_session=False) == 0:
+        db.session.flush()
+        counts = compute_counts(slug)
+        row = {"campaign": slug, "total": counts.total, "anonymous": counts.anonymous,
+               "visible": counts.visible, "version": 1, "modified_date": now}
+        if not create_counts(row):
+            # Created by a concurrent transaction, whose counts do not include this change
+            counters.update(increment, synchronize_session=False)
+
+    if total != 0:
+        record_rate(slug, total, now)
+    if total > 0:
+        record_milestone(slug, now)
+
+
+def create_counts(row):
+    """ Insert the counters of a campaign unless they exist; returns whether they were inserted """
+    insert = upsert_insert(db.session)
+    if insert is not None:
+        statement = insert(SignatureCount.__table__).values(**row).on_conflict_do_nothing(index_elements=["campaign"])
+        return db.session.execute(statement).rowcount == 1
+    try:
+        with db.session.begin_nested():
+            db.session.add(SignatureCount(**row))
+        return True
+    except IntegrityError:
+        return False
+
+
+def record_milestone(slug, now):
+    """ Record the date when a campaign reaches a milestone signature count """
+    reached = db.session.query(SignatureCount.total).filter_by(campaign=slug).scalar()
+    if reached in MILESTONES and db.session.get(Milestone, (slug, reached)) is None:
+        db.session.add(Milestone(campaign=slug, signatures=reached, reached_date=now))
+
+
+def delete_counts(slug):
+    """ Remove the counters, milestones and rates of a deleted campaign """
+    SignatureCount.query.filter_by(campaign=slug).delete()
+    Milestone.query.filter_by(campaign=slug).delete()
+    delete_rates(slug)
+
+
+def compute_counts(slug):
+    """ Count the signatures of a campaign from scratch """
+    total = Signatory.query.filter_by(campaign=slug).count()
+    anonymous = Signatory.query.filter_by(campaign=slug, anonymous=True).count()
+    return SignatureCount(campaign=slug, total=total, anonymous=anonymous, visible=total - anonymous)
+
+
+def reconcile_counts():
+    """
+    Recompute the counters of every campaign from the Signatory table.
+
+    Returns the slugs of the campaigns whose counters were missing or wrong.
+    """
+    rows = (
+        db.session.query(
+            Signatory.campaign,
+            db.func.count(Signatory.id),
+            db.func.sum(db.case((Signatory.anonymous.is_(True), 1), else_=0)),
+        )
+        .group_by(Signatory.campaign)
+        .all()
+    )
+    expected = {slug: (total, anonymous or 0) for slug, total, anonymous in rows}
+
+    corrected = set()
+    for counts in SignatureCount.query.all():
+        total, anonymous = expected.pop(counts.campaign, (0, 0))
+        if (counts.total, counts.anonymous, counts.visible) != (total, anonymous, total - anonymous):
+            counts.total = total
+            counts.anonymous = anonymous
+            counts.visible = total - anonymous
+            counts.version += 1
+            counts.modified_date = datetime.datetime.now(datetime.UTC)
+            corrected.add(counts.campaign)
+
+    for slug, (total, anonymous) in expected.items():
+        db.session.add(SignatureCount(campaign=slug, total=total, anonymous=anonymous, visible=total - anonymous))
+        corrected.add(slug)
+
+    db.session.commit()
+    return corrected
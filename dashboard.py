@@ -0,0 +1,52 @@
+import os
+import datetime
+
+import config
+from db_models import db, Campaign, Signatory, SignatureCount
+
+
+def campaign_stats(owner_orcid=None):
+    """
+    Return the campaigns with their signature statistics, sorted by name.
+
+    Everything is read in one query: the counts come from the SignatureCount
+    table, and the signatures of the last 24 hours are counted per campaign
+    on the (campaign, creation_date) index. Only the campaigns of owner_orcid
+    are returned when it is given.
+    """
+    since = datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=24)
+    recent = (
+        db.select(db.func.count())
+        .where(Signatory.campaign == Campaign.action_slug, Signatory.creation_date >= since)
+        .correlate(Campaign)
+        .scalar_subquery()
+    )
+    query = (
+        db.session.query(
+            Campaign.action_slug,
+            Campaign.action_name,
+            Campaign.owner_orcid,
+            Campaign.is_active,
+            db.func.coalesce(SignatureCount.total, 0),
+            db.func.coalesce(SignatureCount.anonymous, 0),
+            recent,
+        )
+        .outerjoin(SignatureCount, SignatureCount.campaign == Campaign.action_slug)
+        .order_by(Campaign.action_name.asc())
+    )
+    if owner_orcid is not None:
+        query = query.filter(Campaign.owner_orcid == owner_orcid)
+
+    return [
+        {
+            "slug": slug,
+            "name": name,
+            "path": os.path.join(config.site_path, slug),
+            "owner_orcid": owner,
+            "is_active": is_active,
+            "total": total,
+            "recent": recent_total,
+            "anonymous_ratio": anonymous / total if total else 0,
+        }
+        for slug, name, owner, is_active, total, anonymous, recent_total in query
+    ]
@@ -11,6 +11,20 @@ class Signatory(db.Model):
     campaign = db.Column(db.String, db.ForeignKey("campaign.action_slug"), nullable=False)
     affiliation = db.Column(db.String)
     anonymous = db.Column(db.Boolean, nullable=False, default=False)
+    # NULL for signatures made before the column was added
+    creation_date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.UTC))
+    modified_date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.UTC),
+                              onupdate=lambda: datetime.datetime.now(datetime.UTC))
+
+    __table_args__ = (
+        # One signature per ORCID iD and campaign. Also used for lookups by ORCID iD.
+        db.Index("ix_signatory_orcid_campaign", "orcid", "campaign", unique=True),
+        # Signatories and counts of a campaign, in signing or alphabetical order
+        db.Index("ix_signatory_campaign_anonymous_id", "campaign", "anonymous", "id"),
+        db.Index("ix_signatory_campaign_anonymous_name", "campaign", "anonymous", "name", "id"),
+        # Recent signatures of a campaign
+        db.Index("ix_signatory_campaign_creation_date", "campaign", "creation_date"),
+    )
 
     def __repr__(self):
         return "<Signatory %s>" % self.orcid
@@ -41,11 +55,20 @@ class Campaign(db.Model):
     action_name = db.Column(db.String, nullable=False)
     action_short_description = db.Column(db.String, default='')
     action_text = db.Column(db.String, nullable=False)
+    # Plain text start of the description and text, shown on the home page
+    excerpt = db.Column(db.String)
     sort_alphabetical = db.Column(db.Boolean, nullable=False, default=False)
     allow_anonymous = db.Column(db.Boolean, nullable=False, default=True)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
     creation_date = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now(datetime.UTC))
     closed_date = db.Column(db.DateTime, default=None)
+    modified_date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.UTC),
+                              onupdate=lambda: datetime.datetime.now(datetime.UTC))
+
+    __table_args__ = (
+        # Campaigns of an editor, by name
+        db.Index("ix_campaign_owner_orcid_name", "owner_orcid", "action_name"),
+    )
 
     def __repr__(self):
         return "<Campaign %s>" % self.action_slug
@@ -57,3 +80,58 @@ class UserRole(db.Model):
 
     def __repr__(self):
         return "<UserRole %s>" % self.name
+
+
+class SignatureCount(db.Model):
+    campaign = db.Column(db.String, db.ForeignKey("campaign.action_slug"), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    anonymous = db.Column(db.Integer, nullable=False, default=0)
+    visible = db.Column(db.Integer, nullable=False, default=0)
+    # Incremented, and the date updated, on every change to the campaign's signatures
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    modified_date = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return "<SignatureCount %s>" % self.campaign
+
+
+class SignatureRate(db.Model):
+    # Signatures added and removed per campaign and time bucket, kept up to date with the counters
+    campaign = db.Column(db.String, db.ForeignKey("campaign.action_slug"), primary_key=True)
+    resolution = db.Column(db.String(length=6), primary_key=True)  # "minute", "hour" or "day"
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the bucket, in UTC
+    added = db.Column(db.Integer, nullable=False, default=0)
+    removed = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "<SignatureRate %s %s %s>" % (self.campaign, self.resolution, self.bucket)
+
+
+class Milestone(db.Model):
+    campaign = db.Column(db.String, db.ForeignKey("campaign.action_slug"), primary_key=True)
+    signatures = db.Column(db.Integer, primary_key=True)
+    reached_date = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.UTC))
+
+    def __repr__(self):
+        return "<Milestone %s %d>" % (self.campaign, self.signatures)
+
+
+class AppState(db.Model):
+    # Values kept between starts of the app, such as the schema fingerprint
+    name = db.Column(db.String, primary_key=True)
+    value = db.Column(db.String)
+
+    def __repr__(self):
+        return "<AppState %s>" % self.name
+
+
+class CampaignFile(db.Model):
+    # Campaign files already read, so that unchanged files are not parsed again
+    file = db.Column(db.String, primary_key=True)
+    slug = db.Column(db.String, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(length=64), nullable=False)
+
+    def __repr__(self):
+        return "<CampaignFile %s>" % self.file
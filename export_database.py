@@ -1,40 +1,181 @@
-from db_models import Signatory, Admin, Campaign, Block
-from app import app
-
-campaigns_file = "campaigns.txt"
-admins_file = "admins.txt"
-signatories_file = "signatories.txt"
-banned_file = "banned.txt"
-
-with app.app_context():
-
-    with open(signatories_file, "w") as f:
-        f.write("ID, ORCID, Name, Affiliation, Campaign, Anonymous\n")
-        for user in Signatory.query.all():
-            f.write(f"{user.id}, {user.orcid}, {user.name}, {user.affiliation}, {user.campaign}, {user.anonymous}\n")
-
-    with open(admins_file, "w") as f:
-        f.write("ORCID, Name, Role\n")
-        for user in Admin.query.all():
-            f.write(f"{user.orcid}, {user.name}, {user.role_id}\n")
-
-    with open(banned_file, "w") as f:
-        f.write("ORCID, Name\n")
-        for user in Block.query.all():
-            f.write(f"{user.orcid}, {user.name}\n")
-
-    with open(campaigns_file, "w") as f:
-        f.write("Slug, ORCID Ownder, Kind, Name, Short Description, Text, Sort alphabetical, Allow anonymous, Is active, Creation date\n")
-        for campaign in Campaign.query.all():
-            f.write(
-                f"{campaign.action_slug}, \
-                {campaign.owner_orcid}, \
-                {campaign.action_kind}, \
-                {campaign.action_name}, \
-                {campaign.action_short_description}, \
-                {campaign.action_text}, \
-                {campaign.sort_alphabetical}, \
-                {campaign.allow_anonymous}, \
-                {campaign.is_active}, \
-                {campaign.creation_date}\n"
-            )
+""" Bulk export and import of the database
+
+Exports every table to one file per table, as CSV, JSON Lines or Parquet
+(Parquet requires the optional pyarrow package), and imports such files into
+a new database. Rows are streamed in batches, so tables of any size can be
+moved between instances without loading them in memory. The app itself is not
+imported: this only needs the database URI from the .env file. CSV files do not
+distinguish empty and missing text values; use JSON Lines or Parquet for exact
+copies.
+
+    python export_database.py export --format csv --output backup
+    python export_database.py import --format csv --input backup --database sqlite:////path/to/new.db
+"""
+import os
+import csv
+import sys
+import json
+import argparse
+import datetime
+
+import sqlalchemy as sa
+
+import config
+from db_models import db
+
+EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "parquet": "parquet"}
+
+
+def to_text(value):
+    """ Convert a database value to text for the CSV and JSON Lines formats """
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def from_text(column, value):
+    """ Convert a value read from a CSV or JSON Lines file to the type of its column """
+    if value is None or (value == '' and column.nullable and not isinstance(column.type, sa.String)):
+        return None
+    if isinstance(column.type, sa.Boolean):
+        if isinstance(value, str):
+            return value.lower() in ("1", "true")
+        return bool(value)
+    if isinstance(column.type, sa.Integer):
+        return int(value)
+    if isinstance(column.type, sa.DateTime):
+        if isinstance(value, str):
+            return datetime.datetime.fromisoformat(value)
+        return value
+    return value
+
+
+def arrow_type(pa, column):
+    """ Return the Parquet column type of a database column """
+    if isinstance(column.type, sa.Boolean):
+        return pa.bool_()
+    if isinstance(column.type, sa.Integer):
+        return pa.int64()
+    if isinstance(column.type, sa.DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def export_table(connection, table, fmt, path, batch_size, existing=None):
+    """
+    Stream the rows of a table to a file, batch_size rows at a time.
+
+    existing is the set of the names of the columns found in the database;
+    columns of the models missing from an older database are not exported.
+    """
+    selected = [column for column in table.columns if existing is None or column.name in existing]
+    columns = [column.name for column in selected]
+    result = connection.execution_options(yield_per=batch_size).execute(sa.select(*selected))
+    count = 0
+
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for batch in result.partitions():
+                writer.writerows([[to_text(value) for value in row] for row in batch])
+                count += len(batch)
+
+    elif fmt == "jsonl":
+        with open(path, "w", encoding="utf-8") as f:
+            for batch in result.partitions():
+                f.writelines(
+                    json.dumps(dict(zip(columns, map(to_text, row))), ensure_ascii=False) + "\n"
+                    for row in batch
+                )
+                count += len(batch)
+
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(column.name, arrow_type(pa, column)) for column in selected])
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in result.partitions():
+                writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in batch], schema=schema))
+                count += len(batch)
+
+    return count
+
+
+def read_batches(table, fmt, path, batch_size):
+    """ Yield the rows of an exported table as lists of dictionaries """
+    columns = {column.name: column for column in table.columns}
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield [{name: row[name] for name in columns if name in row} for row in batch.to_pylist()]
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        batch = []
+        for row in rows:
+            batch.append({name: from_text(columns[name], value) for name, value in row.items() if name in columns})
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def export_database(engine, fmt, directory, batch_size):
+    os.makedirs(directory, exist_ok=True)
+    inspector = sa.inspect(engine)
+    with engine.connect() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            # The database may predate columns of the models
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            path = os.path.join(directory, f"{table.name}.{EXTENSIONS[fmt]}")
+            count = export_table(connection, table, fmt, path, batch_size, existing)
+            print(f"Exported {count} rows from {table.name} to {path}")
+
+
+def import_database(engine, fmt, directory, batch_size):
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            path = os.path.join(directory, f"{table.name}.{EXTENSIONS[fmt]}")
+            if not os.path.exists(path):
+                continue
+            if connection.execute(sa.select(sa.func.count()).select_from(table)).scalar() > 0:
+                sys.exit(f"Table {table.name} is not empty. Import into a new database.")
+            count = 0
+            for batch in read_batches(table, fmt, path, batch_size):
+                connection.execute(table.insert(), batch)
+                count += len(batch)
+            print(f"Imported {count} rows into {table.name} from {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--format", choices=list(EXTENSIONS), default="csv", help="file format (default: csv)")
+    parser.add_argument("--output", default="export", help="directory of the exported files (default: export)")
+    parser.add_argument("--input", default="export", help="directory of the files to import (default: export)")
+    parser.add_argument("--database", default=config.db_URI, help="database URI (default: the database of the app)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows read or written at a time")
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database)
+    if args.command == "export":
+        export_database(engine, args.format, args.output, args.batch_size)
+    else:
+        import_database(engine, args.format, args.input, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import io
+import csv
+import json
+import shutil
+import tempfile
+import contextlib
+
+from flask import Response, redirect, send_file, stream_with_context
+from werkzeug.security import safe_join
+
+import config
+import jobs
+from db_models import Signatory
+from listing import visible_signatories
+
+EXPORT_FORMATS = {
+    "ods": "application/vnd.oasis.opendocument.spreadsheet",
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+CSV_HEADER = ["Name", "Affiliation", "ORCID iD", "ORCID URL"]
+
+# Number of rows fetched from the database at a time
+BATCH_SIZE = 1000
+
+
+def export_rows(campaign):
+    """ Yield the visible signatories of a campaign, without loading them all at once """
+    query = visible_signatories(campaign).with_entities(Signatory.name, Signatory.affiliation, Signatory.orcid)
+    for name, affiliation, orcid in query.yield_per(BATCH_SIZE):
+        yield [name, affiliation or '', orcid, 'https://orcid.org/' + orcid]
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 65536:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(rows):
+    for name, affiliation, orcid, orcid_url in rows:
+        yield (json.dumps({"name": name, "affiliation": affiliation, "orcid": orcid, "orcid_url": orcid_url})
+               + "\n").encode()
+
+
+def export_path(campaign, fingerprint, fmt):
+    """
+    Return the cache file of an export, or None if the slug is not a safe file name.
+
+    Exports are stored in one directory per campaign, and their names contain
+    a fingerprint of the signatures, so that a new file is used as soon as the
+    signatories change.
+    """
+    directory = safe_join(config.exportdir, campaign.action_slug)
+    if not campaign.action_slug or directory is None:
+        return None
+    return os.path.join(directory, f"{fingerprint}.{fmt}")
+
+
+def remove_stale_exports(path):
+    """ Remove the exports of a campaign that were made for older signatures """
+    directory, name = os.path.split(path)
+    fingerprint = name.split(".")[0]
+    for other in os.listdir(directory):
+        if other.split(".")[0] != fingerprint and not other.startswith("."):
+            try:
+                os.remove(os.path.join(directory, other))
+            except FileNotFoundError:
+                pass
+
+
+def remove_exports(slug):
+    """ Remove all cached exports of a deleted campaign """
+    directory = safe_join(config.exportdir, slug)
+    if slug and directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def export_job_url(campaign, fingerprint, fmt):
+    """ URL where an export made in the background is polled, and then downloaded """
+    return os.path.join(config.site_path, campaign.action_slug, "export", f"{fingerprint}.{fmt}")
+
+
+def build_ods(path, sheet, rows):
+    """
+    Write rows to an ODS file at path, or return the document when path is None.
+
+    Runs in the job pool: the ODS writer is pure Python, and would otherwise
+    hold the GIL of the app for the whole export.
+    """
+    # Imported on first use, to keep the app quick to start
+    from pyexcel_ods3 import save_data
+    if path is None:
+        ods_bytes = io.BytesIO()
+        save_data(ods_bytes, {sheet: rows})
+        return ods_bytes.getvalue()
+    with atomic_write(path) as f:
+        save_data(f, {sheet: rows}, file_type="ods")
+
+
+def ods_job(campaign, path):
+    """ Start the job writing the ODS export of a campaign to path, or return the one running """
+    return jobs.submit(path, build_ods, lambda: (path, campaign.action_slug, list(export_rows(campaign))))
+
+
+def export_response(campaign, fingerprint, fmt, rows=0):
+    """
+    Send the visible signatories of a campaign as an ODS, CSV or NDJSON file.
+
+    Files are served from the export cache when it is current. Otherwise CSV
+    and NDJSON are streamed to the client while being written to the cache,
+    and ODS documents are written to the cache by the job pool before being
+    sent. ODS exports of more than export_async_rows rows are redirected to
+    their job URL, which is polled until the file is ready.
+    """
+    download_name = f"{campaign.action_slug}.{fmt}"
+    path = export_path(campaign, fingerprint, fmt)
+
+    if path is not None and os.path.exists(path):
+        return send_file(path, mimetype=EXPORT_FORMATS[fmt], as_attachment=True, download_name=download_name)
+
+    if fmt == "ods":
+        if path is None:
+            ods_bytes = jobs.submit(("ods", campaign.action_slug, fingerprint), build_ods,
+                                    lambda: (None, campaign.action_slug, list(export_rows(campaign)))).result()
+            return send_file(io.BytesIO(ods_bytes), mimetype=EXPORT_FORMATS[fmt], as_attachment=True,
+                             download_name=download_name)
+
+        job = ods_job(campaign, path)
+        if rows > config.export_async_rows:
+            return redirect(export_job_url(campaign, fingerprint, fmt), 303)
+        job.result()
+        return send_file(path, mimetype=EXPORT_FORMATS[fmt], as_attachment=True, download_name=download_name)
+
+    if fmt == "csv":
+        chunks = csv_chunks(export_rows(campaign))
+    else:
+        chunks = ndjson_chunks(export_rows(campaign))
+
+    if path is not None:
+        chunks = tee_to_file(chunks, path)
+
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    return response
+
+
+def export_job(campaign, fingerprint, fmt):
+    """
+    Return the file of an export made in the background, or None while its job runs.
+
+    The state of the job is read from the export cache, so that it can be
+    polled from any process; a job is started when none is running here.
+    """
+    path = export_path(campaign, fingerprint, fmt)
+    if os.path.exists(path):
+        return path
+    if (error := jobs.failure(path)) is not None:
+        raise error
+    ods_job(campaign, path)
+    return None
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    """ Write a file under a temporary name and move it into place when complete """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    remove_stale_exports(path)
+
+
+def tee_to_file(chunks, path):
+    """ Yield the chunks while writing them to path; nothing is kept if the stream is interrupted """
+    with atomic_write(path) as f:
+        for chunk in chunks:
+            f.write(chunk)
+            yield chunk
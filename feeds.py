@@ -0,0 +1,145 @@
+import os
+import gzip
+import datetime
+from types import SimpleNamespace
+
+from flask import request, make_response
+
+import config
+import jobs
+from cache import Cache
+from validators import not_modified, set_validators
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Serialized feeds and their compressed variants, by feed, with the ETag of
+# the state they were built from
+feed_cache = Cache(maxsize=config.page_cache_size)
+
+# Columns of the campaigns and milestones shown in the feeds
+CAMPAIGN_FIELDS = ("action_slug", "action_name", "action_kind", "action_short_description", "action_text",
+                   "creation_date", "closed_date")
+MILESTONE_FIELDS = ("signatures", "reached_date")
+
+
+def feed_data(row, fields):
+    """ Copy the fields of a database row, to send them to the job pool """
+    return SimpleNamespace(**{field: getattr(row, field) for field in fields})
+
+
+def site_feed(campaigns):
+    """ Build the Atom feed of the active campaigns """
+    # Imported on first use, to keep the app quick to start
+    from feedgen.feed import FeedGenerator
+    fg = FeedGenerator()
+    fg.id(os.path.join(config.signatories_url, "feed"))
+    fg.title(config.site_title)
+    fg.subtitle(config.site_subtitle)
+    fg.link(href=os.path.join(config.signatories_url, "feed"), rel='self')
+    fg.language('en')
+    fg.author(name=config.site_title)
+
+    # Create list of feed entries
+    for row in campaigns:
+        if row.action_slug not in ['demo', 'demo-no-anonymous']:
+            fe = fg.add_entry()
+            fe.id(os.path.join(config.signatories_url, row.action_slug))
+            fe.title(row.action_name)
+            fe.summary(row.action_short_description)
+            fe.link(href=os.path.join(config.signatories_url, row.action_slug))
+            fe.published(row.creation_date.replace(tzinfo=datetime.UTC))
+            fe.content(row.action_text, type='html')
+
+    return fg.atom_str(pretty=False)
+
+
+def campaign_feed(campaign, milestones):
+    """ Build the Atom feed of a campaign: its creation, signature milestones and closure """
+    campaign_url = os.path.join(config.signatories_url, campaign.action_slug)
+    feed_url = os.path.join(campaign_url, "feed")
+
+    from feedgen.feed import FeedGenerator
+    fg = FeedGenerator()
+    fg.id(feed_url)
+    fg.title(campaign.action_name)
+    fg.subtitle(campaign.action_short_description or campaign.action_kind)
+    fg.link(href=feed_url, rel='self')
+    fg.link(href=campaign_url, rel='alternate')
+    fg.language('en')
+    fg.author(name=config.site_title)
+
+    fe = fg.add_entry()
+    fe.id(campaign_url)
+    fe.title(campaign.action_name)
+    fe.summary(campaign.action_short_description)
+    fe.link(href=campaign_url)
+    fe.published(campaign.creation_date.replace(tzinfo=datetime.UTC))
+
+    for milestone in milestones:
+        fe = fg.add_entry()
+        fe.id(f"{campaign_url}#signatures-{milestone.signatures}")
+        fe.title(f"{campaign.action_name}: {milestone.signatures} signatures")
+        fe.summary(f"The {campaign.action_kind} has reached {milestone.signatures} signatures.")
+        fe.link(href=campaign_url)
+        fe.published(milestone.reached_date.replace(tzinfo=datetime.UTC))
+
+    if campaign.closed_date is not None:
+        fe = fg.add_entry()
+        fe.id(f"{campaign_url}#closed")
+        fe.title(f"{campaign.action_name}: closed")
+        fe.summary(f"The {campaign.action_kind} is closed and no longer accepts signatures.")
+        fe.link(href=campaign_url)
+        fe.published(campaign.closed_date.replace(tzinfo=datetime.UTC))
+
+    return fg.atom_str(pretty=False)
+
+
+def compressed_feed(build, *arguments):
+    """ Build a feed and its compressed variants; runs in the job pool """
+    return compress(build(*arguments))
+
+
+def compress(body):
+    """ Return the feed body with its precompressed variants, by content coding """
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+    return variants
+
+
+def preferred_encoding():
+    """ Return the best content coding accepted by the client """
+    if brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def feed_response(key, etag, last_modified, build, arguments):
+    """
+    Serve a feed from the cache, building it with build(*arguments()) in the
+    job pool when the cached version does not match etag (the state of the
+    campaigns it shows). Requests for a feed being built wait for that build.
+    """
+    encoding = preferred_encoding()
+    variant_etag = f"{etag}-{encoding}"
+    if (response := not_modified(variant_etag, last_modified)) is not None:
+        response.vary.add("Accept-Encoding")
+        return response
+
+    cached = feed_cache.get(key)
+    if cached is None or cached[0] != etag:
+        job = jobs.submit((key, etag), compressed_feed, lambda: (build, *arguments()))
+        cached = (etag, job.result())
+        feed_cache.set(key, cached)
+
+    response = make_response(cached[1][encoding])
+    response.headers.set('Content-Type', 'application/atom+xml; charset=utf-8')
+    if encoding != "identity":
+        response.headers.set('Content-Encoding', encoding)
+    response.vary.add("Accept-Encoding")
+    return set_validators(response, variant_etag, last_modified)
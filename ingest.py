@@ -0,0 +1,172 @@
+""" Write-behind queue for signatures
+
+When ingest_queue is enabled, the sign and delete requests of the user page
+are appended to a local SQLite queue file and the request returns at once. A
+background thread applies the queued entries to the database in batches, one
+commit per batch. The user page reads the pending entries of the logged in
+user, so users always see their own changes.
+
+Entries are only removed from the queue after the batch is committed, and
+applying an entry again has no effect, so nothing is lost or counted twice
+if the app stops in between. A lock file makes sure that a single process
+drains the queue at a time.
+"""
+import os
+import sqlite3
+import datetime
+import threading
+
+from sqlalchemy.exc import OperationalError
+
+from db_models import db
+from signatures import sign, unsign
+from storage import file_lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    orcid TEXT NOT NULL,
+    name TEXT,
+    campaign TEXT NOT NULL,
+    affiliation TEXT,
+    anonymous INTEGER,
+    created TEXT NOT NULL
+)
+"""
+
+
+class IngestQueue:
+    """ Durable queue of signature changes, applied to the database by a background thread """
+
+    def __init__(self, path, interval=0.2, batch_size=500):
+        self.path = path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.app = None
+        self.on_commit = None
+        self._local = threading.local()
+        self._pid = None
+        self._stop = threading.Event()
+        self._drain_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = self.connect()
+        connection.execute(SCHEMA)
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_queue_orcid_campaign ON queue (orcid, campaign)")
+        connection.commit()
+
+    def connect(self):
+        """ Return the queue connection of the current thread (and process) """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            # WAL with synchronous=NORMAL survives a crash of the app without an fsync per entry
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def start(self, app, on_commit=None):
+        """ Start the writer thread of the current process; on_commit(campaigns) is called after each batch """
+        self.app = app
+        self.on_commit = on_commit
+        self.ensure_writer()
+
+    def ensure_writer(self):
+        # Threads do not survive a fork: start a writer in each new process
+        if self.app is not None and self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._stop.clear()
+            threading.Thread(target=self.run, name="ingest-writer", daemon=True).start()
+
+    def put(self, kind, orcid, name, campaign, affiliation=None, anonymous=None):
+        """ Queue a signature ("sign") or its removal ("delete") """
+        self.ensure_writer()
+        connection = self.connect()
+        connection.execute(
+            "INSERT INTO queue (kind, orcid, name, campaign, affiliation, anonymous, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (kind, orcid, name, campaign, affiliation, anonymous,
+             datetime.datetime.now(datetime.UTC).isoformat()),
+        )
+        connection.commit()
+
+    def pending(self, orcid, campaign):
+        """ Return the latest queued change of a signature as a dictionary, or None """
+        row = self.connect().execute(
+            "SELECT kind, name, affiliation, anonymous FROM queue "
+            "WHERE orcid = ? AND campaign = ? ORDER BY id DESC LIMIT 1",
+            (orcid, campaign),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"kind": row[0], "name": row[1], "affiliation": row[2], "anonymous": bool(row[3])}
+
+    def size(self):
+        return self.connect().execute("SELECT count(*) FROM queue").fetchone()[0]
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                while self.drain() == self.batch_size:
+                    pass
+            except Exception as error:
+                print(f"Signature queue: {error!r}")
+
+    def stop(self):
+        """ Stop the writer and apply the remaining entries """
+        self._stop.set()
+        if self.app is not None:
+            while self.drain() > 0:
+                pass
+
+    def drain(self):
+        """ Apply the next batch of entries to the database; returns the number of entries applied """
+        with self._drain_lock, file_lock(self.path + ".lock"):
+            connection = self.connect()
+            entries = connection.execute(
+                "SELECT id, kind, orcid, name, campaign, affiliation, anonymous FROM queue ORDER BY id LIMIT ?",
+                (self.batch_size,),
+            ).fetchall()
+            if not entries:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    for entry in entries:
+                        self.apply(entry)
+                    db.session.commit()
+                except OperationalError:
+                    # The database is unavailable: keep the entries for the next attempt
+                    db.session.rollback()
+                    raise
+                except Exception:
+                    # Apply the entries one at a time, dropping the ones that can not be applied
+                    db.session.rollback()
+                    for entry in entries:
+                        try:
+                            self.apply(entry)
+                            db.session.commit()
+                        except OperationalError:
+                            db.session.rollback()
+                            raise
+                        except Exception as error:
+                            db.session.rollback()
+                            print(f"Signature queue: dropping entry {entry[0]} for {entry[2]}: {error!r}")
+
+            connection.execute("DELETE FROM queue WHERE id <= ?", (entries[-1][0],))
+            connection.commit()
+
+        if self.on_commit is not None:
+            self.on_commit({entry[4] for entry in entries})
+        return len(entries)
+
+    @staticmethod
+    def apply(entry):
+        _, kind, orcid, name, campaign, affiliation, anonymous = entry
+        if kind == "sign":
+            sign(orcid, name, campaign, affiliation, bool(anonymous))
+        else:
+            unsign(orcid, campaign)
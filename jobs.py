@@ -0,0 +1,106 @@
+""" Pool of processes for CPU-bound work
+
+Building ODS files and feeds holds the GIL for as long as it runs, which
+stalls every other request served by the process. These jobs run in a pool of
+job_workers processes instead, started on first use with spawn: forked
+processes would inherit the database connections and threads of the app.
+Jobs receive plain data, and never use the database. The processes import the
+modules of the job functions (exports, feeds and snapshots) and the main
+module, which creates nothing on import: app.py creates the app, the ORCID
+client and the ingest queue in create_app().
+
+Jobs are identified by a key: a job submitted while another one with the same
+key is running joins it, so that concurrent requests for the same export or
+feed build it once. Failures are remembered for a minute, so that a job that
+fails is not started again by every poll. With job_workers = 0, jobs run in
+the request thread.
+"""
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from cache import Cache
+
+_executor = None
+_lock = threading.Lock()
+# Futures of the running jobs, by key
+_running = {}
+# Exceptions of the jobs that failed recently, by key
+failures = Cache(maxsize=256, ttl=60)
+
+
+def submit(key, function, arguments=tuple):
+    """
+    Run function(*arguments()) in the pool, or join the running job of key; returns its Future.
+
+    arguments is called in the calling thread, where it may read the
+    database, and only when no job of key is running.
+    """
+    with _lock:
+        if (future := _running.get(key)) is not None:
+            return future
+        future = _running[key] = Future()
+        failures.delete(key)
+    future.add_done_callback(lambda done: _finished(key, done))
+
+    try:
+        if config.job_workers <= 0:
+            future.set_result(function(*arguments()))
+        else:
+            job = _pool_submit(function, *arguments())
+            job.add_done_callback(lambda done: _copy_result(done, future))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def _pool_submit(function, *arguments):
+    global _executor
+    for attempt in range(2):
+        with _lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=config.job_workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            executor = _executor
+        try:
+            return executor.submit(function, *arguments)
+        except BrokenProcessPool:
+            # A process of the pool died (e.g. out of memory): start a new pool
+            with _lock:
+                if _executor is executor:
+                    _executor = None
+            if attempt:
+                raise
+
+
+def _copy_result(job, future):
+    if job.cancelled():
+        future.set_exception(CancelledError())
+    elif (error := job.exception()) is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(job.result())
+
+
+def _finished(key, future):
+    with _lock:
+        if _running.get(key) is future:
+            del _running[key]
+    if future.exception() is not None:
+        failures.set(key, future.exception())
+
+
+def failure(key):
+    """ Return the exception of the job of key if it failed in the last minute, or None """
+    return failures.get(key)
+
+
+def shutdown():
+    """ Cancel the pending jobs, and stop the processes of the pool once the running jobs finish """
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
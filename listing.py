@@ -0,0 +1,41 @@
+from db_models import db, Signatory
+
+
+def visible_signatories(campaign):
+    """ Query of the visible signatories of a campaign, in display order """
+    query = Signatory.query.filter_by(campaign=campaign.action_slug, anonymous=False)
+    if campaign.sort_alphabetical:
+        return query.order_by(Signatory.name.asc(), Signatory.id.asc())
+    else:
+        return query.order_by(Signatory.id.asc())
+
+
+def signatories_page(campaign, limit, after_id=None, after_name=None):
+    """
+    Return one page of visible signatories and the cursor of the next page.
+
+    Pages are selected with keyset pagination: the cursor is the (name, id)
+    of the last signatory of the previous page when the campaign is sorted
+    alphabetically, and its id otherwise. The next cursor is None on the last
+    page.
+    """
+    query = visible_signatories(campaign)
+    if after_id is not None:
+        if campaign.sort_alphabetical:
+            query = query.filter(db.tuple_(Signatory.name, Signatory.id) > (after_name or '', after_id))
+        else:
+            query = query.filter(Signatory.id > after_id)
+
+    # Fetch one more row than needed to know if there is a next page
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if campaign.sort_alphabetical:
+            cursor = {"after_id": last.id, "after_name": last.name}
+        else:
+            cursor = {"after_id": last.id}
+    else:
+        cursor = None
+
+    return rows, cursor
@@ -0,0 +1,161 @@
+""" Request, SQL, template and ORCID timing, in the Prometheus text format
+
+Request latency and the number and duration of SQL queries are recorded per
+endpoint, template render times per template and ORCID API latency per call.
+The metrics are kept in memory, per process, and served to administrators on
+/metrics. Requests and queries slower than slow_request_ms and slow_query_ms
+are printed, with the number of queries of the request, to spot N+1 patterns.
+"""
+import time
+import bisect
+import threading
+
+from flask import g, request, has_request_context, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+
+# Upper bounds of the histogram buckets
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """ Cumulative histogram of observations, by label values """
+
+    def __init__(self, name, help, labels, buckets=SECONDS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            counts = self.series.get(label_values)
+            if counts is None:
+                # One count per bucket, then +Inf, the count and the sum
+                counts = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0, 0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((key, list(counts)) for key, counts in self.series.items())
+        for label_values, counts in series:
+            labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_count{{{labels}}} {counts[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {counts[-1]:.6f}")
+        return lines
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_seconds = Histogram(
+    "signatories_request_duration_seconds", "Time to build the response, by endpoint and status",
+    ("endpoint", "method", "status"))
+request_queries = Histogram(
+    "signatories_request_queries", "SQL queries per request, by endpoint", ("endpoint",), QUERIES)
+request_sql_seconds = Histogram(
+    "signatories_request_sql_seconds", "Time spent in SQL per request, by endpoint", ("endpoint",))
+sql_seconds = Histogram(
+    "signatories_sql_duration_seconds", "SQL query duration, by statement type", ("statement",))
+template_seconds = Histogram(
+    "signatories_template_render_seconds", "Template render time, by template", ("template",))
+orcid_seconds = Histogram(
+    "signatories_orcid_request_seconds", "ORCID API response time, by call and status", ("call", "status"))
+
+HISTOGRAMS = (request_seconds, request_queries, request_sql_seconds, sql_seconds, template_seconds, orcid_seconds)
+
+
+def endpoint():
+    # View name, without the name of its blueprint
+    return (request.endpoint or "unmatched").rpartition(".")[2]
+
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_sql_seconds = 0.0
+
+
+def finish_request(response):
+    if "metrics_start" not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_start
+    name = endpoint()
+    request_seconds.observe(elapsed, name, request.method, response.status_code)
+    request_queries.observe(g.metrics_queries, name)
+    request_sql_seconds.observe(g.metrics_sql_seconds, name)
+
+    if config.slow_request_ms and elapsed * 1000 >= config.slow_request_ms:
+        print(f"Slow request: {request.method} {request.path} took {elapsed * 1000:.0f} ms "
+              f"with {g.metrics_queries} queries ({g.metrics_sql_seconds * 1000:.0f} ms in SQL)")
+    return response
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+    sql_seconds.observe(elapsed, statement.lstrip().split(None, 1)[0].upper())
+
+    in_request = has_request_context() and "metrics_queries" in g
+    if in_request:
+        g.metrics_queries += 1
+        g.metrics_sql_seconds += elapsed
+
+    if config.slow_query_ms and elapsed * 1000 >= config.slow_query_ms:
+        where = f" in {request.method} {request.path}" if in_request else ""
+        print(f"Slow query{where}: {elapsed * 1000:.0f} ms: {' '.join(statement.split())[:500]}")
+
+
+def start_template(sender, template, context, **extra):
+    g.setdefault("metrics_templates", []).append(time.perf_counter())
+
+
+def finish_template(sender, template, context, **extra):
+    starts = g.get("metrics_templates")
+    if starts:
+        template_seconds.observe(time.perf_counter() - starts.pop(), template.name or "string")
+
+
+def orcid_response(response, *args, **kwargs):
+    """ requests hook: record the latency of an ORCID API response """
+    call = "token" if response.request.method == "POST" else response.url.rstrip("/").rsplit("/", 1)[-1]
+    orcid_seconds.observe(response.elapsed.total_seconds(), call, response.status_code)
+
+
+def init_app(app, orcid_session=None):
+    """ Record the requests of app and, when given, the calls made with an ORCID requests session """
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    before_render_template.connect(start_template, app)
+    template_rendered.connect(finish_template, app)
+    if orcid_session is not None:
+        orcid_session.hooks["response"].append(orcid_response)
+
+
+def render(gauges=()):
+    """ Return all metrics in the Prometheus text format; gauges are (name, help, value) """
+    lines = []
+    for name, help, value in gauges:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,149 @@
+""" Upgrades of existing databases
+
+db.create_all() creates missing tables, but it does not modify tables that
+already exist. The functions in this module bring databases created by older
+versions up to date. A fingerprint of the models is stored in the database
+once it is current, so that later starts skip the upgrade until the models
+change.
+"""
+import hashlib
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import DBAPIError
+
+from db_models import db, Signatory, Campaign, Admin, UserRole, SignatureCount, SignatureRate, AppState
+from counters import reconcile_counts
+from analytics import rebuild_rates
+from utils import campaign_excerpt
+
+
+def schema_fingerprint():
+    """ Hash of the tables, columns and indexes declared in the models """
+    parts = []
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts += [f"{column.name} {column.type!r} {column.nullable} {column.server_default is not None}"
+                  for column in table.columns]
+        parts += sorted(f"{index.name} {index.unique}" for index in table.indexes)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def prepare_database(admin_orcid):
+    """
+    Create the database, or upgrade it, unless it is already current.
+
+    A new database gets the user roles and admin_orcid as administrator. The
+    name of the administrator is filled in at their first sign in, so that
+    starting the app never waits for the ORCID API.
+    """
+    fingerprint = schema_fingerprint()
+    try:
+        state = db.session.get(AppState, "schema")
+    except DBAPIError:
+        # New database, or one that predates the fingerprint
+        db.session.rollback()
+        state = None
+    if state is not None and state.value == fingerprint:
+        return
+
+    if not inspect(db.engine).has_table(Admin.__tablename__):
+        print(f"Database doesn't exist. Creating new database: {db.engine.url!r}")
+        db.create_all()
+        db.session.add(Admin(orcid=admin_orcid, name='', role_id=3))
+        for role_name in ("User", "Editor", "Administrator"):
+            db.session.add(UserRole(name=role_name))
+        db.session.commit()
+
+    db.create_all()
+    db.session.commit()
+    upgrade_database()
+
+    # Fill the signature counters when upgrading a database that predates them
+    if SignatureCount.query.first() is None and Signatory.query.first() is not None:
+        print("Computing signature counters for all campaigns")
+        reconcile_counts()
+
+    # Fill the signing rates from the signature dates when upgrading a database that predates them
+    if SignatureRate.query.first() is None and Signatory.query.filter(Signatory.creation_date.is_not(None)).first():
+        print("Computing signing rates for all campaigns")
+        rebuild_rates()
+
+    db.session.merge(AppState(name="schema", value=fingerprint))
+    db.session.commit()
+
+
+def upgrade_database():
+    """ Apply all upgrades to the database of the current app context """
+    inspector = inspect(db.engine)
+
+    add_missing_columns(inspector)
+
+    indexes = {index["name"] for index in inspector.get_indexes(Signatory.__tablename__)}
+    if "ix_signatory_orcid_campaign" not in indexes:
+        remove_duplicate_signatures()
+
+    create_missing_indexes()
+    fill_campaign_excerpts()
+
+
+def add_missing_columns(inspector):
+    """
+    Add the columns declared in the models that do not exist yet.
+
+    New columns must either be nullable or have a server default, so that
+    existing rows get a value.
+    """
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+            print(f"Adding column {table.name}.{column.name}")
+            db.session.execute(db.text(ddl))
+    db.session.commit()
+
+
+def remove_duplicate_signatures():
+    """
+    Keep only the first signature of each ORCID iD and campaign.
+
+    Older versions did not enforce one signature per ORCID iD at the database
+    level, and the unique index can not be created while duplicates exist.
+    """
+    first_signatures = (
+        db.session.query(db.func.min(Signatory.id))
+        .group_by(Signatory.orcid, Signatory.campaign)
+    )
+    deleted = Signatory.query.filter(Signatory.id.not_in(first_signatures)).delete(synchronize_session=False)
+    db.session.commit()
+
+    if deleted > 0:
+        print(f"Removed {deleted} duplicate signature(s)")
+        reconcile_counts()
+
+
+def fill_campaign_excerpts():
+    """ Compute the home page excerpts of the campaigns created before they were stored """
+    campaigns = (
+        db.session.query(Campaign.action_slug, Campaign.action_short_description, Campaign.action_text)
+        .filter(Campaign.excerpt.is_(None))
+        .all()
+    )
+    for slug, short_description, text in campaigns:
+        Campaign.query.filter_by(action_slug=slug).update(
+            {"excerpt": campaign_excerpt(short_description or '', text)}, synchronize_session=False)
+    db.session.commit()
+    if campaigns:
+        print(f"Computed the excerpts of {len(campaigns)} campaign(s)")
+
+
+def create_missing_indexes():
+    """ Create the indexes declared in the models that do not exist yet """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -0,0 +1,94 @@
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import Cache
+
+
+class OrcidClient:
+    """
+    Client for reading public ORCID records.
+
+    HTTP connections are pooled and reused, every call has a timeout and
+    failed calls are retried a bounded number of times. The search token is
+    kept until it expires, and resolved names are cached for name_cache_ttl
+    seconds.
+    """
+
+    def __init__(self, client_id, client_secret, token_url, api_url,
+                 timeout=5, retries=2, pool_size=10, name_cache_ttl=86400):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "POST"),
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = threading.Lock()
+        self.names = Cache(maxsize=10000, ttl=name_cache_ttl)
+
+    def search_token(self):
+        """ Return a token for reading public records, requesting a new one when it expired """
+        with self._token_lock:
+            if self._token is None or time.monotonic() >= self._token_expires:
+                response = self.session.post(
+                    self.token_url,
+                    data={
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "grant_type": "client_credentials",
+                        "scope": "/read-public",
+                    },
+                    headers={"Accept": "application/json"},
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                data = response.json()
+                self._token = data["access_token"]
+                # Renew the token a minute before it expires
+                self._token_expires = time.monotonic() + int(data.get("expires_in", 3600)) - 60
+            return self._token
+
+    def read_person(self, orcid):
+        """ Return the public person section of an ORCID record """
+        for attempt in range(2):
+            token = self.search_token()
+            response = self.session.get(
+                f"{self.api_url}/{orcid}/person",
+                headers={"Accept": "application/orcid+json", "Authorization": f"Bearer {token}"},
+                timeout=self.timeout,
+            )
+            # The token was revoked before its expiry date: get a new one and try again
+            if response.status_code == 401 and attempt == 0:
+                with self._token_lock:
+                    self._token = None
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def get_name(self, orcid):
+        """ Return the public name of an ORCID iD ('' if it is private) """
+        name = self.names.get(orcid)
+        if name is None:
+            person = self.read_person(orcid)
+            name = ''
+            if person.get("name") is not None:
+                parts = [person["name"].get("given-names"), person["name"].get("family-name")]
+                name = " ".join(part["value"] for part in parts if part is not None)
+            self.names.set(orcid, name)
+        return name
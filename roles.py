@@ -0,0 +1,79 @@
+import uuid
+
+from flask import g, session
+
+import config
+from db_models import db, Admin, AppState
+from cache import Cache
+from storage import upsert_insert
+
+# Role of each ORCID iD in the Admin table (None when absent), by roles version
+# and ORCID iD. Every change to the Admin table changes the roles version in the
+# database, so that all the processes of the app read the roles again.
+role_cache = Cache(maxsize=4096, ttl=config.role_cache_ttl)
+
+# Name of the AppState row holding the roles version
+ROLES_VERSION = "roles"
+
+_missing = object()
+
+
+def roles_version():
+    """ Return the current roles version, read once per request """
+    if "roles_version" not in g:
+        g.roles_version = db.session.query(AppState.value).filter_by(name=ROLES_VERSION).scalar()
+    return g.roles_version
+
+
+def change_roles_version():
+    """ Give the roles a new version; call in the transaction that changes the Admin table """
+    version = uuid.uuid4().hex
+    insert = upsert_insert(db.session)
+    if insert is not None:
+        db.session.execute(insert(AppState.__table__).values(name=ROLES_VERSION, value=version)
+                           .on_conflict_do_update(index_elements=["name"], set_={"value": version}))
+    else:
+        db.session.merge(AppState(name=ROLES_VERSION, value=version))
+    g.pop("roles_version", None)
+
+
+def admin_role(orcid):
+    """ Return the role_id of an ORCID iD in the Admin table, or None """
+    key = (roles_version(), orcid)
+    role_id = role_cache.get(key, _missing)
+    if role_id is _missing:
+        user = Admin.query.filter_by(orcid=orcid).first()
+        if user is None:
+            role_id = None
+        else:
+            role_id = user.role_id
+        role_cache.set(key, role_id)
+    return role_id
+
+
+def current_role():
+    """
+    Return the role_id of the logged in user, resolved once per request.
+
+    Visitors that are not logged in have role 0. Logged in users that are not
+    in the Admin table are editors (2) when everyone_is_editor is set, and
+    have role 0 otherwise.
+    """
+    if "role_id" not in g:
+        if session.get("orcid") is None:
+            g.role_id = 0
+        else:
+            role_id = admin_role(session["orcid"])
+            if role_id is None:
+                if config.everyone_is_editor:
+                    role_id = 2
+                else:
+                    role_id = 0
+            g.role_id = role_id
+    return g.role_id
+
+
+def invalidate_role(orcid):
+    """ Forget the role of an ORCID iD resolved for the current request, after it was modified """
+    if session.get("orcid") == orcid:
+        g.pop("role_id", None)
@@ -0,0 +1,378 @@
+""" Serve the app with several worker processes
+
+The master process opens the listening socket and forks `workers` processes,
+each running a waitress server with `threads` threads on the shared socket.
+The master never imports the app: every worker imports it after the fork, so
+that workers do not share database connections or threads, and a reload runs
+the current code.
+
+    python serve.py           # start the master
+    python serve.py status    # print the health of the running workers
+
+Signals of the master:
+    SIGHUP     read .env again and replace the workers with new ones; the old
+               workers finish their requests first
+    SIGUSR1    print the health of the workers
+    SIGTERM    stop the workers gracefully, and then the master
+
+Each worker is replaced after max_requests requests (0 for never), plus a
+random number of up to max_requests_jitter so that the workers are not all
+replaced at once. Workers write their health (requests served, requests in
+progress, memory) to a status file every second; a worker whose status is
+not updated for worker_timeout seconds is killed and replaced.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import importlib
+import contextlib
+import threading
+
+import dotenv
+
+import config
+
+# Seconds between two status updates of a worker
+HEARTBEAT = 1
+# Workers that exit sooner than this after their start are replaced after a pause
+MIN_LIFETIME = 5
+
+
+class RequestCounter:
+    """ WSGI middleware counting the requests served, and those in progress """
+
+    def __init__(self, app):
+        self.app = app
+        self.requests = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+        try:
+            return self.app(environ, start_response)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def status_path(pid):
+    return os.path.join(config.statusdir, f"worker-{pid}.json")
+
+
+def write_status(path, status):
+    # Written to a temporary file first, so that readers never see a partial file
+    temporary = f"{path}.{os.getpid()}"
+    with open(temporary, "w") as f:
+        json.dump(status, f)
+    os.replace(temporary, path)
+
+
+def read_status(pid):
+    try:
+        with open(status_path(pid)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def memory_mb():
+    """ Resident memory of the current process, in MB """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Peak memory, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+"""
+Worker processes
+"""
+
+
+def run_worker(sock, index):
+    """ Serve requests on sock until stopped, or recycled after max_requests """
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+    from waitress import create_server
+    import app as signatories
+    import jobs
+
+    counter = RequestCounter(signatories.create_app())
+    server = create_server(counter, sockets=[sock], threads=config.threads)
+    limit = config.max_requests + random.randint(0, config.max_requests_jitter) if config.max_requests else None
+
+    started = time.time()
+    path = status_path(os.getpid())
+
+    def report(state):
+        write_status(path, {
+            "index": index,
+            "pid": os.getpid(),
+            "state": state,
+            "started": started,
+            "heartbeat": time.time(),
+            "requests": counter.requests,
+            "active": counter.active,
+            "connections": len(channels(server)),
+            "memory_mb": round(memory_mb(), 1),
+            "max_requests": limit,
+        })
+
+    report("serving")
+    print(f"Worker {index} ({os.getpid()}) serving with {config.threads} threads", flush=True)
+    last_report = time.monotonic()
+    while not stopping.is_set() and (limit is None or counter.requests < limit):
+        server.asyncore.loop(timeout=HEARTBEAT, map=server._map, count=1)
+        if time.monotonic() - last_report >= HEARTBEAT:
+            report("serving")
+            last_report = time.monotonic()
+
+    reason = "stopped" if stopping.is_set() else f"recycled after {counter.requests} requests"
+    print(f"Worker {index} ({os.getpid()}) {reason}", flush=True)
+    report("stopping")
+
+    # Stop accepting connections, and finish the requests in progress
+    server.close()
+    deadline = time.monotonic() + config.graceful_timeout
+    while channels(server) and time.monotonic() < deadline:
+        for channel in channels(server):
+            with channel.requests_lock:
+                idle = not channel.requests and channel.request is None and not channel.total_outbufs_len
+            if idle:
+                channel.handle_close()
+            else:
+                channel.will_close = True
+        server.asyncore.loop(timeout=0.1, map=server._map, count=1)
+        if time.monotonic() - last_report >= HEARTBEAT:
+            report("stopping")
+            last_report = time.monotonic()
+    server.task_dispatcher.shutdown(timeout=1)
+
+    # Forked processes exit without running the atexit handlers
+    if signatories.ingest_queue is not None:
+        signatories.ingest_queue.stop()
+    jobs.shutdown()
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+def channels(server):
+    return [channel for channel in server._map.values() if channel is not server and hasattr(channel, "requests")]
+
+
+"""
+Master process
+"""
+
+
+class Master:
+    def __init__(self, sock):
+        self.sock = sock
+        # Workers by pid: (generation, index, start time)
+        self.workers = {}
+        self.generation = 0
+        self.signals = []
+
+    def fork(self, target, *args):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                target(*args)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        return pid
+
+    def prepare(self):
+        """
+        Create or upgrade the database and read the campaign files once, in a
+        child process, before starting workers. Returns False when it failed.
+        """
+        def prepare_app():
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            config.ingest_queue = False
+            from app import create_app
+            create_app()
+        pid = self.fork(prepare_app)
+        while True:
+            try:
+                _, status = os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+        return os.waitstatus_to_exitcode(status) == 0
+
+    def spawn(self, index):
+        pid = self.fork(run_worker, self.sock, index)
+        self.workers[pid] = (self.generation, index, time.monotonic())
+
+    def generation_workers(self, generation):
+        return {pid: worker for pid, worker in self.workers.items() if worker[0] == generation}
+
+    def run(self):
+        os.makedirs(config.statusdir, exist_ok=True)
+        # Status files left by workers of a previous master
+        for name in os.listdir(config.statusdir):
+            if name.startswith("worker-"):
+                os.remove(os.path.join(config.statusdir, name))
+        if not self.prepare():
+            print("The app could not be started", flush=True)
+            return 1
+
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+
+        print(f"Master ({os.getpid()}) listening on {config.host}:{config.port} with {config.workers} workers", flush=True)
+        for index in range(config.workers):
+            self.spawn(index)
+
+        while True:
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return 0
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGUSR1:
+                    print_status(self.workers)
+            self.reap()
+            self.check_heartbeats()
+            time.sleep(0.5)
+
+    def reap(self):
+        """ Replace the workers of the current generation that exited """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            with contextlib.suppress(OSError):
+                os.remove(status_path(pid))
+            if worker is None:
+                continue
+            generation, index, started = worker
+            if generation != self.generation:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0:
+                print(f"Worker {index} ({pid}) exited with status {code}", flush=True)
+            if time.monotonic() - started < MIN_LIFETIME:
+                # Do not restart a failing worker in a tight loop
+                time.sleep(1)
+            self.spawn(index)
+
+    def check_heartbeats(self):
+        now = time.time()
+        for pid, (generation, index, started) in list(self.generation_workers(self.generation).items()):
+            status = read_status(pid)
+            if status is None:
+                # Still starting: allow worker_timeout seconds for the import of the app
+                if time.monotonic() - started < config.worker_timeout:
+                    continue
+            elif now - status["heartbeat"] < config.worker_timeout:
+                continue
+            print(f"Worker {index} ({pid}) is not responding, killing it", flush=True)
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+
+    def reload(self):
+        """ Read .env again, and replace all workers """
+        dotenv.load_dotenv(override=True)
+        importlib.reload(config)
+        os.makedirs(config.statusdir, exist_ok=True)
+        if not self.prepare():
+            print("Reload failed, the current workers are kept", flush=True)
+            return
+        old = list(self.generation_workers(self.generation))
+        self.generation += 1
+        print(f"Reloading: starting {config.workers} new workers", flush=True)
+        for index in range(config.workers):
+            self.spawn(index)
+        for pid in old:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    def stop(self):
+        print("Stopping workers", flush=True)
+        for pid in self.workers:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + config.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+            with contextlib.suppress(OSError):
+                os.remove(status_path(pid))
+
+
+def print_status(workers=None):
+    """ Print the health of the workers found in the status directory """
+    try:
+        names = sorted(os.listdir(config.statusdir))
+    except FileNotFoundError:
+        names = []
+    now = time.time()
+    print(f"{'worker':>6} {'pid':>8} {'state':>9} {'uptime':>8} {'requests':>9} {'active':>6} "
+          f"{'conns':>5} {'memory':>9} {'heartbeat':>9}")
+    for name in names:
+        if not (name.startswith("worker-") and name.endswith(".json")):
+            continue
+        status = read_status(int(name[len("worker-"):-len(".json")]))
+        if status is None or (workers is not None and status["pid"] not in workers):
+            continue
+        print(f"{status['index']:>6} {status['pid']:>8} {status['state']:>9} "
+              f"{now - status['started']:>7.0f}s {status['requests']:>9} {status['active']:>6} "
+              f"{status['connections']:>5} {status['memory_mb']:>6.1f} MB {now - status['heartbeat']:>8.1f}s")
+    sys.stdout.flush()
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        print_status()
+        return 0
+    if not hasattr(os, "fork"):
+        print("Multiple worker processes need os.fork; use python app.py on this system", flush=True)
+        return 1
+
+    sock = socket.create_server((config.host, int(config.port)), backlog=2048)
+    sock.set_inheritable(True)
+    return Master(sock).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
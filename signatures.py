@@ -0,0 +1,63 @@
+from sqlalchemy.exc import IntegrityError
+
+from db_models import db, Signatory
+from counters import adjust_counts
+from storage import upsert_insert
+
+
+def sign(orcid, name, slug, affiliation, anonymous):
+    """
+    Add or update the signature of an ORCID iD, with its counters.
+
+    The signature is inserted with ON CONFLICT DO NOTHING on (orcid, campaign),
+    and updated when it already exists, so that a new signature takes one
+    transaction and concurrent submissions of the same signature never fail
+    or create duplicates. Nothing is committed.
+    """
+    if not insert_signature(orcid, name, slug, affiliation, anonymous):
+        update_signature(orcid, slug, affiliation, anonymous)
+
+
+def insert_signature(orcid, name, slug, affiliation, anonymous):
+    """ Insert a new signature; returns False if the ORCID iD already signed the campaign """
+    values = {"orcid": orcid, "name": name, "campaign": slug, "affiliation": affiliation, "anonymous": anonymous}
+    insert = upsert_insert(db.session)
+
+    if insert is not None:
+        statement = insert(Signatory).values(**values).on_conflict_do_nothing(index_elements=["orcid", "campaign"])
+        inserted = db.session.execute(statement).rowcount > 0
+    else:
+        # Other databases: detect the conflict with the unique index, in a savepoint
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Signatory).values(**values))
+            inserted = True
+        except IntegrityError:
+            inserted = False
+
+    if inserted:
+        adjust_counts(slug, total=1, anonymous=int(anonymous))
+    return inserted
+
+
+def update_signature(orcid, slug, affiliation, anonymous):
+    """ Update an existing signature, adjusting the anonymous counter if the choice changed """
+    signature = db.update(Signatory).where(Signatory.orcid == orcid, Signatory.campaign == slug)
+
+    flipped = db.session.execute(
+        signature.where(Signatory.anonymous != anonymous).values(affiliation=affiliation, anonymous=anonymous)
+    ).rowcount
+    if flipped:
+        adjust_counts(slug, anonymous=1 if anonymous else -1)
+    else:
+        db.session.execute(signature.values(affiliation=affiliation))
+        adjust_counts(slug)
+
+
+def unsign(orcid, slug):
+    """ Remove the signature of an ORCID iD, with its counters. Nothing is committed. """
+    user = Signatory.query.filter_by(orcid=orcid, campaign=slug).first()
+    if user is not None:
+        adjust_counts(slug, total=-1, anonymous=-int(user.anonymous))
+        Signatory.query.filter_by(orcid=orcid, campaign=slug).delete()
+    return user
@@ -0,0 +1,183 @@
+""" Frozen snapshots of closed campaigns
+
+A closed campaign only changes when it is edited or reopened, or when an
+administrator deletes signatures. Its page, as visitors see it, is frozen into
+static files together with its ODS and CSV exports:
+
+    cache/snapshots/<slug>/index.html (and index.html.gz, index.html.br)
+    cache/snapshots/<slug>/<slug>.ods
+    cache/snapshots/<slug>/<slug>.csv
+    cache/snapshots/<slug>/snapshot.json
+
+action() serves these files without reading the database, and a reverse
+proxy can serve them directly.
+
+The first view of a closed campaign starts a job that builds its snapshot in
+a staging directory, and a later view installs it after reading the campaign
+again. Installing and removing a snapshot hold the same file lock, and the
+campaign is read with that lock held, so a snapshot removed after a change is
+never replaced by one built before it.
+"""
+import os
+import json
+import shutil
+import datetime
+import tempfile
+
+from flask import make_response, send_file
+from werkzeug.security import safe_join
+
+import config
+import jobs
+from exports import EXPORT_FORMATS, csv_chunks
+from feeds import compress, preferred_encoding
+from storage import file_lock
+from validators import not_modified, set_validators
+
+PAGE = "index.html"
+META = "snapshot.json"
+# Exports kept in snapshots
+SNAPSHOT_FORMATS = ("ods", "csv")
+# File name suffix of each content coding of the page
+SUFFIXES = {"identity": "", "gzip": ".gz", "br": ".br"}
+
+
+def snapshot_dir(slug):
+    """ Return the directory of the snapshot of a campaign, or None if the slug is not a safe file name """
+    if not slug:
+        return None
+    return safe_join(config.snapshotdir, slug)
+
+
+def staging_dir(slug):
+    if not slug:
+        return None
+    return safe_join(config.snapshotdir, ".staging", slug)
+
+
+def read_meta(directory, version):
+    """ Return the metadata of a snapshot, or None if there is none for this version of the site """
+    try:
+        with open(os.path.join(directory, META)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == version else None
+
+
+def snapshot_response(slug, version):
+    """ Serve the frozen page of a campaign, or return None if it has no snapshot """
+    directory = snapshot_dir(slug)
+    if directory is None or (meta := read_meta(directory, version)) is None:
+        return None
+
+    encoding = preferred_encoding()
+    if encoding not in meta["encodings"]:
+        encoding = "identity"
+    etag = f"{meta['fingerprint']}-{encoding}"
+    last_modified = datetime.datetime.fromisoformat(meta["last_modified"]) if meta["last_modified"] else None
+    if (response := not_modified(etag, last_modified)) is not None:
+        response.vary.add("Accept-Encoding")
+        return response
+
+    try:
+        with open(os.path.join(directory, PAGE + SUFFIXES[encoding]), "rb") as f:
+            body = f.read()
+    except OSError:
+        # Removed since the metadata was read
+        return None
+
+    response = make_response(body)
+    response.headers.set("Content-Type", "text/html; charset=utf-8")
+    if encoding != "identity":
+        response.headers.set("Content-Encoding", encoding)
+    response.vary.add("Accept-Encoding")
+    return set_validators(response, etag, last_modified)
+
+
+def snapshot_export(slug, fmt, version):
+    """ Send an export of a campaign from its snapshot, or return None if it has none """
+    directory = snapshot_dir(slug)
+    if fmt not in SNAPSHOT_FORMATS or directory is None or read_meta(directory, version) is None:
+        return None
+    try:
+        return send_file(os.path.join(directory, f"{slug}.{fmt}"), mimetype=EXPORT_FORMATS[fmt],
+                         as_attachment=True, download_name=f"{slug}.{fmt}")
+    except OSError:
+        return None
+
+
+def build_snapshot(staging, meta, page, sheet, rows):
+    """
+    Write the files of a snapshot into the directory staging.
+
+    Runs in the job pool. The files are written to a temporary directory that
+    is then renamed, so that a staging directory is always complete.
+    """
+    # Imported on first use, to keep the app quick to start
+    from pyexcel_ods3 import save_data
+
+    os.makedirs(os.path.dirname(staging), exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=os.path.dirname(staging), prefix=".tmp-")
+    try:
+        variants = compress(page.encode())
+        for encoding, body in variants.items():
+            with open(os.path.join(temporary, PAGE + SUFFIXES[encoding]), "wb") as f:
+                f.write(body)
+        with open(os.path.join(temporary, f"{sheet}.ods"), "wb") as f:
+            save_data(f, {sheet: rows}, file_type="ods")
+        with open(os.path.join(temporary, f"{sheet}.csv"), "wb") as f:
+            for chunk in csv_chunks(rows):
+                f.write(chunk)
+        with open(os.path.join(temporary, META), "w") as f:
+            json.dump({**meta, "encodings": list(variants)}, f)
+        os.rename(temporary, staging)
+    except OSError:
+        # Another process built the same snapshot first
+        shutil.rmtree(temporary, ignore_errors=True)
+        if not os.path.isdir(staging):
+            raise
+
+
+def freeze(slug, fingerprint, version, last_modified, page, rows, current_fingerprint):
+    """
+    Build the snapshot of a closed campaign, or install it once built.
+
+    fingerprint identifies the state of the campaign the page was rendered
+    from; current_fingerprint() reads it again from the database, to check
+    that the campaign did not change before the snapshot is installed.
+    rows() returns the export rows of the campaign.
+    """
+    directory, staging = snapshot_dir(slug), staging_dir(slug)
+    if directory is None or staging is None:
+        return
+    staged = os.path.join(staging, fingerprint)
+
+    if read_meta(staged, version) is None:
+        meta = {
+            "fingerprint": fingerprint,
+            "version": version,
+            "last_modified": last_modified.isoformat() if last_modified else None,
+        }
+        jobs.submit(("snapshot", slug, fingerprint), build_snapshot, lambda: (staged, meta, page, slug, rows()))
+        return
+
+    with file_lock(directory + ".lock"):
+        if current_fingerprint() != fingerprint:
+            return
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(staged, directory)
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def remove_snapshot(slug):
+    """ Remove the snapshot of a campaign, and the snapshots being built; call after committing a change """
+    directory, staging = snapshot_dir(slug), staging_dir(slug)
+    if directory is None or staging is None:
+        return
+    # Snapshots are only installed from a staging directory
+    if not os.path.exists(directory) and not os.path.exists(staging):
+        return
+    with file_lock(directory + ".lock"):
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,121 @@
+""" Database engine configuration
+
+The database is SQLite by default. SQLite connections are opened in WAL mode
+with a busy timeout, so that readers never block the writer and concurrent
+signatures wait for the write lock instead of failing with "database is
+locked". Any other SQLAlchemy URI, such as PostgreSQL, can be set with db_URI.
+"""
+import os
+import sqlite3
+import tempfile
+import importlib
+import contextlib
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+import config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Dialects with INSERT ... ON CONFLICT. Imported on first use: the PostgreSQL
+# dialect is slow to import and not needed with SQLite.
+UPSERT_DIALECTS = ("sqlite", "postgresql")
+
+
+def upsert_insert(session):
+    """ Return the insert() of the session's dialect if it has ON CONFLICT, or None """
+    dialect = session.get_bind().dialect.name
+    if dialect not in UPSERT_DIALECTS:
+        return None
+    return importlib.import_module(f"sqlalchemy.dialects.{dialect}").insert
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == "sqlite"
+
+
+def sqlite_path(uri):
+    """ Return the path of an SQLite database file, or None for other databases """
+    url = make_url(uri)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url.database)
+
+
+def engine_options(uri):
+    """ Return the SQLAlchemy engine options for a database URI """
+    options = {
+        "pool_size": config.db_pool_size,
+        "max_overflow": config.db_max_overflow,
+        "pool_timeout": config.db_pool_timeout,
+    }
+    if is_sqlite(uri):
+        # The driver waits busy_timeout for locks itself; the pragma is set again on connect
+        options["connect_args"] = {"timeout": config.sqlite_busy_timeout / 1000, "check_same_thread": False}
+    else:
+        options["pool_recycle"] = config.db_pool_recycle
+        options["pool_pre_ping"] = True
+    return options
+
+
+def create_database_dir(uri):
+    """ Create the directory of an SQLite database file if it is missing """
+    path = sqlite_path(uri)
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={config.sqlite_busy_timeout}")
+    cursor.execute(f"PRAGMA mmap_size={config.sqlite_mmap_size}")
+    cursor.close()
+
+
+def backup_sqlite(uri):
+    """
+    Write a consistent copy of an SQLite database to a temporary file next to
+    it, and return its path; the caller removes the file.
+
+    The online backup API includes the changes that are still in the WAL file,
+    which a plain copy of the database file would miss. The copy is written to
+    disk so that the database is never held in memory.
+    """
+    path = sqlite_path(uri)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=".backup-", suffix=".db", delete=False) as f:
+        backup_path = f.name
+    try:
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(backup_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    except BaseException:
+        os.remove(backup_path)
+        raise
+    return backup_path
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """ Hold an exclusive lock on a file, shared by all the processes of the app """
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,87 @@
+""" Export of a database created before the columns and tables added to the models """
+import os
+import csv
+import json
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+import export_database
+
+# The tables of the first release of the app
+baseline = sa.MetaData()
+sa.Table("user_role", baseline,
+         sa.Column("role_id", sa.Integer, primary_key=True),
+         sa.Column("name", sa.String(255), nullable=False))
+sa.Table("campaign", baseline,
+         sa.Column("action_slug", sa.String, primary_key=True),
+         sa.Column("owner_orcid", sa.String(19)),
+         sa.Column("owner_name", sa.String),
+         sa.Column("action_kind", sa.String, nullable=False),
+         sa.Column("action_name", sa.String, nullable=False),
+         sa.Column("action_short_description", sa.String),
+         sa.Column("action_text", sa.String, nullable=False),
+         sa.Column("sort_alphabetical", sa.Boolean, nullable=False),
+         sa.Column("allow_anonymous", sa.Boolean, nullable=False),
+         sa.Column("is_active", sa.Boolean, nullable=False),
+         sa.Column("creation_date", sa.DateTime, nullable=False),
+         sa.Column("closed_date", sa.DateTime))
+sa.Table("signatory", baseline,
+         sa.Column("id", sa.Integer, primary_key=True),
+         sa.Column("orcid", sa.String(19), nullable=False),
+         sa.Column("name", sa.String, nullable=False),
+         sa.Column("campaign", sa.String, sa.ForeignKey("campaign.action_slug"), nullable=False),
+         sa.Column("affiliation", sa.String),
+         sa.Column("anonymous", sa.Boolean, nullable=False))
+sa.Table("admin", baseline,
+         sa.Column("orcid", sa.String(19), primary_key=True),
+         sa.Column("name", sa.String),
+         sa.Column("role_id", sa.Integer, sa.ForeignKey("user_role.role_id"), nullable=False))
+sa.Table("block", baseline,
+         sa.Column("orcid", sa.String(19), primary_key=True),
+         sa.Column("name", sa.String))
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    baseline.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(baseline.tables["user_role"].insert(), [{"role_id": 1, "name": "User"}])
+        connection.execute(baseline.tables["campaign"].insert(), [{
+            "action_slug": "demo", "owner_orcid": "", "owner_name": "", "action_kind": "Petition",
+            "action_name": "Demo", "action_short_description": "", "action_text": "Text",
+            "sort_alphabetical": False, "allow_anonymous": True, "is_active": True,
+            "creation_date": datetime.datetime(2024, 1, 1), "closed_date": None,
+        }])
+        connection.execute(baseline.tables["signatory"].insert(), [
+            {"orcid": "0000-0002-1694-233X", "name": "Josiah", "campaign": "demo", "affiliation": "", "anonymous": False},
+            {"orcid": "0000-0002-1825-0097", "name": "Anne", "campaign": "demo", "affiliation": None, "anonymous": True},
+        ])
+    return engine
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_export_baseline_database(baseline_engine, tmp_path, fmt):
+    directory = tmp_path / "export"
+    export_database.export_database(baseline_engine, fmt, str(directory), batch_size=1)
+
+    # Only the tables and columns of the database are exported
+    assert sorted(os.listdir(directory)) == sorted(f"{name}.{fmt}" for name in baseline.tables)
+    with open(directory / f"campaign.{fmt}", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f]
+    assert list(rows[0]) == [column.name for column in baseline.tables["campaign"].columns]
+    assert rows[0]["action_slug"] == "demo"
+
+    # The files can be imported into a database with the current models
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    export_database.import_database(engine, fmt, str(directory), batch_size=1)
+    with engine.connect() as connection:
+        signatories = connection.execute(sa.text("SELECT orcid, anonymous FROM signatory ORDER BY id")).all()
+        excerpt = connection.execute(sa.text("SELECT excerpt FROM campaign")).scalar()
+    assert signatories == [("0000-0002-1694-233X", 0), ("0000-0002-1825-0097", 1)]
+    assert excerpt is None
@@ -1,16 +1,19 @@
+from jinja2 import Environment
+from jinja2.filters import do_truncate
+from markupsafe import Markup
 from requests import RequestException
 
+# Length of the campaign excerpts of the home page
+EXCERPT_LENGTH = 450
 
-def get_orcid_name(api, orcid):
+_jinja_env = Environment()
+
+
+def get_orcid_name(client, orcid):
+    """ Return the public name of an ORCID iD, or '' if it is private or can not be read """
     try:
-        token = api.get_search_token_from_orcid()
-        user_data = api.read_record_public(orcid, 'record', token)
-        if user_data["person"]["name"] is not None:
-            name = (user_data["person"]["name"]["given-names"]["value"]
-                    + " " + user_data["person"]["name"]["family-name"]["value"])
-        else:
-            name = ''
-    except RequestException:
+        name = client.get_name(orcid)
+    except (RequestException, ValueError, KeyError):
         name = ''
     return name
 
@@ -32,3 +35,8 @@ def checksum(x):
         return True
     else:
         return False
+
+
+def campaign_excerpt(short_description, text):
+    """ Plain text excerpt of a campaign for the home page, as striptags | truncate(450) would render it """
+    return do_truncate(_jinja_env, Markup(f"{short_description}. {text}").striptags(), EXCERPT_LENGTH)
@@ -0,0 +1,67 @@
+import os
+import glob
+import hashlib
+import datetime
+
+from flask import request, make_response
+
+import config
+
+
+def _source_hash():
+    """ Return a hash of the templates and modules of the app, which changes on each deployment """
+    sources = glob.glob(os.path.join(config.basedir, "templates", "*")) + glob.glob(os.path.join(config.basedir, "*.py"))
+    sha = hashlib.sha1()
+    for path in sorted(sources):
+        with open(path, "rb") as f:
+            sha.update(os.path.relpath(path, config.basedir).encode() + b"\0" + f.read())
+    return sha.hexdigest()
+
+
+deployment = _source_hash()
+
+
+def utc(date):
+    """ Return a database datetime (naive, in UTC) as an aware datetime """
+    if date is None:
+        return None
+    return date.replace(tzinfo=datetime.UTC)
+
+
+def make_etag(*parts):
+    """ Return an ETag computed from the values that a response depends on """
+    return hashlib.sha1(repr((deployment,) + parts).encode()).hexdigest()
+
+
+def last_change(*dates):
+    """ Return the most recent of the given database datetimes (None are ignored) """
+    dates = [utc(date) for date in dates if date is not None]
+    if not dates:
+        return None
+    return max(dates)
+
+
+def not_modified(etag, last_modified):
+    """
+    Return a 304 Not Modified response if the client already has the current
+    version of the resource, and None otherwise.
+
+    Call this before doing the work of building the response.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    response = make_response("")
+    set_validators(response, etag, last_modified)
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+    return None
+
+
+def set_validators(response, etag, last_modified):
+    """ Add the ETag and Last-Modified headers, and ask clients to revalidate """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response